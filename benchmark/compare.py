@@ -0,0 +1,93 @@
+"""Compare two vtk_benchmark JSON result files.
+
+Usage: compare.py <baseline.json> <current.json> [--threshold 0.10]
+                  [--allow-missing]
+
+Exits with 1 when the median time of any benchmark is slower than the
+baseline by more than the threshold (a fraction, 0.10 meaning 10%), or
+when a benchmark of the baseline is missing from the current results and
+--allow-missing is not given.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, current, threshold):
+    """Compare the median times of the benchmarks in both result sets.
+
+    Args:
+        baseline (dict): stored results
+        current (dict): new results
+        threshold (float): allowed slowdown as a fraction
+
+    Returns:
+        list: (name, baseline median, current median, ratio, regressed)
+        for every benchmark present in both
+    """
+    rows = []
+    for name, result in sorted(current["benchmarks"].items()):
+        reference = baseline["benchmarks"].get(name)
+        if reference is None or not reference["median"]:
+            continue
+        ratio = result["median"] / reference["median"]
+        rows.append(
+            (name, reference["median"], result["median"], ratio, ratio > 1 + threshold)
+        )
+    return rows
+
+
+def missing(baseline, current):
+    """Benchmarks of the baseline without a current result, e.g. because
+    the module they need was not built.
+
+    Returns:
+        list: sorted benchmark names
+    """
+    return sorted(set(baseline["benchmarks"]) - set(current["benchmarks"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument(
+        "--allow-missing",
+        action="store_true",
+        help="don't fail on baseline benchmarks missing from the current results",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    rows = compare(baseline, current, args.threshold)
+    print("%-24s %12s %12s %8s" % ("benchmark", "baseline s", "current s", "ratio"))
+    for name, reference, result, ratio, regressed in rows:
+        print(
+            "%-24s %12.4f %12.4f %7.2fx%s"
+            % (name, reference, result, ratio, "  REGRESSION" if regressed else "")
+        )
+    absent = missing(baseline, current)
+    for name in absent:
+        print("%-24s %12s" % (name, "MISSING"))
+    status = 0
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(
+            "Slower than baseline by more than %.0f%%: %s"
+            % (args.threshold * 100, ", ".join(regressions))
+        )
+        status = 1
+    if absent:
+        print("Missing from the current results: %s" % ", ".join(absent))
+        if not args.allow_missing:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import sys
+
+from conans import ConanFile, tools
+from conan.tools.cmake import CMake, CMakeDeps, CMakeToolchain
+
+
+class VTKBenchmarkConan(ConanFile):
+    """Times a fixed set of VTK workloads against a packaged VTK build.
+
+    Run with:
+        conan test benchmark vtk/9.1.0@lkeb/stable -o vtk:...
+
+    Environment:
+        VTK_BENCHMARK_OUTPUT     JSON results file (default: in the build folder)
+        VTK_BENCHMARK_BASELINE   stored results to compare against
+        VTK_BENCHMARK_THRESHOLD  allowed slowdown before a regression is
+                                 flagged, as a fraction (default 0.10)
+        VTK_BENCHMARK_ALLOW_MISSING  1 to not fail on baseline benchmarks
+                                 missing from the results
+        VTK_BENCHMARK_SIZE       edge length of the synthetic volume
+        VTK_BENCHMARK_RENDER     1 to time the offscreen render
+    """
+
+    settings = "os", "compiler", "build_type", "arch"
+    generators = "CMakeDeps"
+    exports_sources = ["CMakeLists.txt", "vtk_benchmark.cxx", "compare.py"]
+
+    def generate(self):
+        generator = None
+        if self.settings.os == "Linux":
+            generator = "Ninja"
+        tc = CMakeToolchain(self, generator=generator)
+        tc.generate()
+
+    def build(self):
+        cmake = CMake(self)
+        cmake.configure()
+        cmake.build()
+
+    def _render_enabled(self):
+        value = tools.get_env("VTK_BENCHMARK_RENDER")
+        if value is not None:
+            return value not in ("0", "")
+        # OSMesa and EGL builds render offscreen without a display
+        if self.deps_user_info["vtk"].rendering_backend in ("osmesa", "egl"):
+            return True
+        return self.settings.os != "Linux" or bool(tools.get_env("DISPLAY"))
+
+    def test(self):
+        if tools.cross_building(self):
+            return
+        output = tools.get_env(
+            "VTK_BENCHMARK_OUTPUT",
+            os.path.join(self.build_folder, "vtk_benchmark.json"),
+        )
+        args = ['--output "%s"' % output]
+        size = tools.get_env("VTK_BENCHMARK_SIZE")
+        if size:
+            args.append("--size %s" % size)
+        if self._render_enabled():
+            args.append("--render")
+
+        program = os.path.join(self.build_folder, "vtk_benchmark")
+        if self.settings.os == "Windows":
+            program = os.path.join(
+                self.build_folder, str(self.settings.build_type), "vtk_benchmark.exe"
+            )
+        self.run('"%s" %s' % (program, " ".join(args)), run_environment=True)
+        self.output.info("Benchmark results written to %s" % output)
+
+        baseline = tools.get_env("VTK_BENCHMARK_BASELINE")
+        if baseline:
+            flags = "--threshold %s" % tools.get_env("VTK_BENCHMARK_THRESHOLD", "0.10")
+            if tools.get_env("VTK_BENCHMARK_ALLOW_MISSING", "0") not in ("0", ""):
+                flags += " --allow-missing"
+            self.run(
+                '"%s" "%s" "%s" "%s" %s'
+                % (
+                    sys.executable,
+                    os.path.join(self.source_folder, "compare.py"),
+                    baseline,
+                    output,
+                    flags,
+                )
+            )
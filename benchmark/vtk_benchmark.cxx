@@ -0,0 +1,275 @@
+// Times a fixed set of VTK workloads and writes the results as JSON.
+//
+// Usage: vtk_benchmark [--output file.json] [--size N] [--repetitions N] [--render]
+#include <vtkCellArray.h>
+#include <vtkFloatArray.h>
+#include <vtkImageData.h>
+#include <vtkImageReslice.h>
+#include <vtkMarchingCubes.h>
+#include <vtkNew.h>
+#include <vtkPointData.h>
+#include <vtkPoints.h>
+#include <vtkPolyData.h>
+#include <vtkQuadricDecimation.h>
+#include <vtkSmartPointer.h>
+#include <vtkTransform.h>
+#include <vtkUnstructuredGrid.h>
+#include <vtkVersion.h>
+
+#ifdef BENCH_HAVE_IOXML
+#include <vtkXMLUnstructuredGridReader.h>
+#include <vtkXMLUnstructuredGridWriter.h>
+#endif
+
+#ifdef BENCH_HAVE_RENDERING
+#include <vtkActor.h>
+#include <vtkAutoInit.h>
+#include <vtkCamera.h>
+#include <vtkPolyDataMapper.h>
+#include <vtkRenderWindow.h>
+#include <vtkRenderer.h>
+VTK_MODULE_INIT(vtkRenderingOpenGL2);
+#endif
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <functional>
+#include <iostream>
+#include <string>
+#include <utility>
+#include <vector>
+
+namespace
+{
+struct Result
+{
+  std::string Name;
+  std::vector<double> Seconds;
+};
+
+Result Time(const std::string& name, int repetitions, const std::function<void()>& workload)
+{
+  Result result{ name, {} };
+  for (int i = 0; i < repetitions; ++i)
+  {
+    auto start = std::chrono::steady_clock::now();
+    workload();
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+    result.Seconds.push_back(elapsed.count());
+  }
+  std::sort(result.Seconds.begin(), result.Seconds.end());
+  std::cout << name << ": median " << result.Seconds[result.Seconds.size() / 2] << " s"
+            << std::endl;
+  return result;
+}
+
+// Sum of three gaussian blobs, contoured at several levels
+vtkSmartPointer<vtkImageData> MakeVolume(int size)
+{
+  auto volume = vtkSmartPointer<vtkImageData>::New();
+  volume->SetDimensions(size, size, size);
+  volume->SetSpacing(1.0 / size, 1.0 / size, 1.0 / size);
+  vtkNew<vtkFloatArray> scalars;
+  scalars->SetName("density");
+  scalars->SetNumberOfTuples(static_cast<vtkIdType>(size) * size * size);
+  const double centers[3][3] = { { 0.3, 0.3, 0.5 }, { 0.7, 0.5, 0.4 }, { 0.5, 0.7, 0.6 } };
+  vtkIdType id = 0;
+  for (int k = 0; k < size; ++k)
+  {
+    for (int j = 0; j < size; ++j)
+    {
+      for (int i = 0; i < size; ++i, ++id)
+      {
+        const double p[3] = { double(i) / size, double(j) / size, double(k) / size };
+        double value = 0.0;
+        for (const auto& c : centers)
+        {
+          const double d2 = (p[0] - c[0]) * (p[0] - c[0]) + (p[1] - c[1]) * (p[1] - c[1]) +
+            (p[2] - c[2]) * (p[2] - c[2]);
+          value += std::exp(-d2 * 40.0);
+        }
+        scalars->SetValue(id, static_cast<float>(value));
+      }
+    }
+  }
+  volume->GetPointData()->SetScalars(scalars);
+  return volume;
+}
+
+vtkSmartPointer<vtkPolyData> MarchingCubes(vtkImageData* volume)
+{
+  vtkNew<vtkMarchingCubes> contour;
+  contour->SetInputData(volume);
+  contour->GenerateValues(3, 0.3, 0.9);
+  contour->ComputeNormalsOn();
+  contour->Update();
+  return contour->GetOutput();
+}
+
+// Hexahedral grid over the volume, with its scalars
+vtkSmartPointer<vtkUnstructuredGrid> MakeGrid(vtkImageData* volume)
+{
+  int dims[3];
+  volume->GetDimensions(dims);
+  auto grid = vtkSmartPointer<vtkUnstructuredGrid>::New();
+  vtkNew<vtkPoints> points;
+  points->SetNumberOfPoints(volume->GetNumberOfPoints());
+  for (vtkIdType id = 0; id < volume->GetNumberOfPoints(); ++id)
+  {
+    points->SetPoint(id, volume->GetPoint(id));
+  }
+  grid->SetPoints(points);
+  grid->Allocate(volume->GetNumberOfCells());
+  auto index = [&](int i, int j, int k) {
+    return i + static_cast<vtkIdType>(dims[0]) * (j + static_cast<vtkIdType>(dims[1]) * k);
+  };
+  for (int k = 0; k + 1 < dims[2]; ++k)
+  {
+    for (int j = 0; j + 1 < dims[1]; ++j)
+    {
+      for (int i = 0; i + 1 < dims[0]; ++i)
+      {
+        const vtkIdType hex[8] = { index(i, j, k), index(i + 1, j, k), index(i + 1, j + 1, k),
+          index(i, j + 1, k), index(i, j, k + 1), index(i + 1, j, k + 1),
+          index(i + 1, j + 1, k + 1), index(i, j + 1, k + 1) };
+        grid->InsertNextCell(VTK_HEXAHEDRON, 8, hex);
+      }
+    }
+  }
+  grid->GetPointData()->SetScalars(volume->GetPointData()->GetScalars());
+  return grid;
+}
+
+void WriteJson(const std::string& file, int size, const std::vector<Result>& results)
+{
+  std::ofstream out(file);
+  out << "{\n";
+  out << "  \"vtk_version\": \"" << vtkVersion::GetVTKVersion() << "\",\n";
+  out << "  \"volume_size\": " << size << ",\n";
+  out << "  \"benchmarks\": {";
+  for (size_t r = 0; r < results.size(); ++r)
+  {
+    const std::vector<double>& s = results[r].Seconds;
+    double sum = 0.0;
+    for (double value : s)
+    {
+      sum += value;
+    }
+    char line[256];
+    std::snprintf(line, sizeof(line),
+      "\"repetitions\": %d, \"min\": %.6f, \"median\": %.6f, \"mean\": %.6f, \"max\": %.6f",
+      static_cast<int>(s.size()), s.front(), s[s.size() / 2], sum / s.size(), s.back());
+    out << (r ? "," : "") << "\n    \"" << results[r].Name << "\": {" << line << "}";
+  }
+  out << "\n  }\n}\n";
+}
+}
+
+int main(int argc, char* argv[])
+{
+  std::string output = "vtk_benchmark.json";
+  int size = 128;
+  int repetitions = 5;
+  bool render = false;
+  for (int i = 1; i < argc; ++i)
+  {
+    if (!std::strcmp(argv[i], "--output") && i + 1 < argc)
+    {
+      output = argv[++i];
+    }
+    else if (!std::strcmp(argv[i], "--size") && i + 1 < argc)
+    {
+      size = std::atoi(argv[++i]);
+    }
+    else if (!std::strcmp(argv[i], "--repetitions") && i + 1 < argc)
+    {
+      repetitions = std::max(1, std::atoi(argv[++i]));
+    }
+    else if (!std::strcmp(argv[i], "--render"))
+    {
+      render = true;
+    }
+    else
+    {
+      std::cerr << "Usage: " << argv[0]
+                << " [--output file.json] [--size N] [--repetitions N] [--render]" << std::endl;
+      return 1;
+    }
+  }
+
+  std::vector<Result> results;
+  vtkSmartPointer<vtkImageData> volume = MakeVolume(size);
+  vtkSmartPointer<vtkPolyData> surface = MarchingCubes(volume);
+
+  results.push_back(Time("marching_cubes", repetitions, [&]() { MarchingCubes(volume); }));
+
+  results.push_back(Time("image_reslice", repetitions, [&]() {
+    vtkNew<vtkTransform> transform;
+    transform->RotateWXYZ(30.0, 1.0, 1.0, 0.0);
+    vtkNew<vtkImageReslice> reslice;
+    reslice->SetInputData(volume);
+    reslice->SetResliceTransform(transform);
+    reslice->SetInterpolationModeToLinear();
+    reslice->Update();
+  }));
+
+  results.push_back(Time("decimation", repetitions, [&]() {
+    vtkNew<vtkQuadricDecimation> decimate;
+    decimate->SetInputData(surface);
+    decimate->SetTargetReduction(0.9);
+    decimate->Update();
+  }));
+
+#ifdef BENCH_HAVE_IOXML
+  {
+    vtkSmartPointer<vtkUnstructuredGrid> grid = MakeGrid(volume);
+    const std::string gridFile = output + ".vtu";
+    results.push_back(Time("xml_ugrid_write", repetitions, [&]() {
+      vtkNew<vtkXMLUnstructuredGridWriter> writer;
+      writer->SetInputData(grid);
+      writer->SetFileName(gridFile.c_str());
+      writer->SetDataModeToAppended();
+      writer->Write();
+    }));
+    results.push_back(Time("xml_ugrid_read", repetitions, [&]() {
+      vtkNew<vtkXMLUnstructuredGridReader> reader;
+      reader->SetFileName(gridFile.c_str());
+      reader->Update();
+    }));
+    std::remove(gridFile.c_str());
+  }
+#endif
+
+#ifdef BENCH_HAVE_RENDERING
+  if (render)
+  {
+    vtkNew<vtkPolyDataMapper> mapper;
+    mapper->SetInputData(surface);
+    vtkNew<vtkActor> actor;
+    actor->SetMapper(mapper);
+    vtkNew<vtkRenderer> renderer;
+    renderer->AddActor(actor);
+    vtkNew<vtkRenderWindow> window;
+    window->SetOffScreenRendering(1);
+    window->SetSize(1024, 1024);
+    window->AddRenderer(renderer);
+    window->Render();
+    results.push_back(Time("offscreen_render", repetitions, [&]() {
+      for (int frame = 0; frame < 36; ++frame)
+      {
+        renderer->GetActiveCamera()->Azimuth(10.0);
+        window->Render();
+      }
+    }));
+  }
+#endif
+  (void)render;
+
+  WriteJson(output, size, results);
+  return 0;
+}
@@ -1,10 +1,238 @@
+import filecmp
+import functools
+import hashlib
+import json
 import os
 import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from fnmatch import fnmatch
+from io import StringIO
 from conans import ConanFile, tools
+from conans.errors import ConanException, ConanInvalidConfiguration
 from conan.tools.cmake import CMake, CMakeDeps, CMakeToolchain
-from pathlib import Path, PureWindowsPath
+from pathlib import Path
+
+# Phase timings are collected in this file in the source/build folder and
+# summarized in the package by package()
+METRICS_FILE = "vtk_recipe_metrics.json"
+
+
+def _parse_vtk_module(path):
+    """Parse a vtk.module file: keywords start a line, their values follow
+    on indented lines.
+
+    Returns:
+        dict: keyword to list of values
+    """
+    module = {}
+    values = None
+    with open(path) as file:
+        for line in file:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if line[0].isspace():
+                if values is not None:
+                    values.append(line.strip())
+            else:
+                values = module.setdefault(line.strip(), [])
+    return module
+
+
+# Include dirs of the macOS SDK that CMake records in the exported targets
+MACOS_SDK_INCLUDE_RE = (
+    r";(?:/Applications/Xcode[^/;]*\.app/Contents/Developer/Platforms/MacOSX\.platform/Developer"
+    r"|/Library/Developer/CommandLineTools)/SDKs/MacOSX[0-9.]*\.sdk/usr/include"
+)
+
+
+def relocation_rules(macos_sdk=False):
+    """Rules that make the exported CMake files of the package relocatable.
+
+    Args:
+        macos_sdk (bool): drop the include dirs of the macOS SDK
+
+    Returns:
+        list: (regular expression, replacement) tuples
+    """
+    rules = []
+    if macos_sdk:
+        rules.append((MACOS_SDK_INCLUDE_RE, ""))
+    return rules
+
+
+def relocate_text(text, rules):
+    """Apply all relocation rules to text in a single pass.
+
+    Returns:
+        str: the relocated text
+    """
+    if not rules or not text:
+        return text
+    pattern = re.compile(
+        "|".join("(?P<r%d>%s)" % (i, rule) for i, (rule, _) in enumerate(rules))
+    )
+    replacements = {"r%d" % i: replacement for i, (_, replacement) in enumerate(rules)}
+    return pattern.sub(lambda match: replacements[match.lastgroup], text)
+
+
+def relocate_cmake_files(folder, rules, jobs=None):
+    """Apply the relocation rules to all *.cmake files below folder, writing
+    only the files that change.
+
+    Returns:
+        list: paths of the rewritten files
+    """
+
+    def relocate(path):
+        with open(path, encoding="utf-8") as file:
+            text = file.read()
+        relocated = relocate_text(text, rules)
+        if relocated == text:
+            return None
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(relocated)
+        return path
+
+    paths = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(folder)
+        for name in names
+        if fnmatch(name, "*.cmake")
+    ]
+    if not rules or not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return [path for path in executor.map(relocate, paths) if path]
+
+
+def ninja_rule_commands(build_dir):
+    """Commands of the compile and link rules in the rules.ninja of a CMake
+    Ninja build tree, empty if the tree has not been configured yet. CMake
+    writes the compiler and linker launchers into these commands.
+
+    Returns:
+        dict: rule name to its command
+    """
+    rules, name = {}, None
+    path = os.path.join(build_dir, "CMakeFiles", "rules.ninja")
+    if not os.path.isfile(path):
+        return rules
+    with open(path) as file:
+        for line in file:
+            if line.startswith("rule "):
+                name = line.split()[1]
+            elif name and ("_COMPILER__" in name or "_LINKER__" in name):
+                key, _, value = line.strip().partition(" = ")
+                if key == "command":
+                    rules[name] = value
+    return rules
+
+
+def changed_rule_commands(before, after):
+    """Rules present in both trees whose command changed, which makes Ninja
+    rebuild every object compiled or library linked with them.
+
+    Returns:
+        list: sorted rule names
+    """
+    return sorted(
+        name for name in set(before) & set(after) if before[name] != after[name]
+    )
+
+
+def _is_module_variable(name):
+    """True for the cache variables that only select VTK modules"""
+    return name == "VTK_BUILD_ALL_MODULES" or name.startswith(
+        ("VTK_MODULE_ENABLE_", "VTK_GROUP_ENABLE_")
+    )
+
+
+def _process_tree_rss_mib(pid):
+    """Current RSS in MiB of a process and all its descendants, read from
+    /proc (Linux only).
+    """
+    children, rss = {}, {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % entry) as file:
+                stat = file.read()
+        except (IOError, OSError):
+            continue  # exited meanwhile
+        # The command name in parentheses may contain spaces
+        fields = stat[stat.rfind(")") + 2 :].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21])
+    pages, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pages += rss.get(current, 0)
+        pending.extend(children.get(current, ()))
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _PhaseRssSampler:
+    """Samples the RSS of the recipe process tree in a background thread
+    while a phase runs. peak stays None where /proc is not available.
+    """
+
+    interval = 0.5
+
+    def __init__(self):
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if os.path.isdir("/proc/self"):
+            self.peak = 0.0
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+
+    def _run(self):
+        pid = os.getpid()
+        while True:
+            self.peak = max(self.peak, _process_tree_rss_mib(pid))
+            if self._stop.wait(self.interval):
+                break
+
+
+def timed_phase(name):
+    """Decorator recording wall time, CPU time (including child processes)
+    and the peak RSS of the process tree during a recipe phase in
+    METRICS_FILE.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start_wall = time.time()
+            start = os.times()
+            sampler = _PhaseRssSampler()
+            try:
+                with sampler:
+                    return method(self, *args, **kwargs)
+            finally:
+                end = os.times()
+                cpu = sum(end[i] - start[i] for i in range(4))
+                self._record_phase(name, time.time() - start_wall, cpu, sampler.peak)
+
+        return wrapper
+
+    return decorator
 
 
 class VTKConan(ConanFile):
@@ -24,6 +252,7 @@ class VTKConan(ConanFile):
         "vtknetcdf_snprintf.diff",
         "vtktiff_mangle.diff",
     ]
+    exports_sources = ["pgo/*", "cpu_check/*", "scripts/*", "modules/*"]
     source_subfolder = "vtk"
     options = {
         "shared": [True, False],
@@ -37,6 +266,19 @@ class VTKConan(ConanFile):
         "ioxdmf3": [True, False],
         "iolegacy": [True, False],
         "basic_viewer": [True, False],
+        "smp_backend": ["Sequential", "STDThread", "OpenMP", "TBB"],
+        "compiler_cache": [None, "ccache", "sccache"],
+        "unity_build": [True, False],
+        "unity_batch_size": "ANY",
+        "optimization": ["none", "lto", "pgo"],
+        "cpu_target": ["baseline", "x86-64-v2", "x86-64-v3", "native"],
+        "compile_jobs": [None, "ANY"],
+        "link_jobs": [None, "ANY"],
+        "build_debug": [True, False],
+        "debug_info": ["keep", "split", "strip"],
+        "qt_modules": "ANY",
+        "modules": "ANY",
+        "rendering_backend": ["x11", "osmesa", "egl"],
     }
     default_options = (
         "shared=True",
@@ -50,6 +292,19 @@ class VTKConan(ConanFile):
         "ioxdmf3=False",
         "iolegacy=False",
         "basic_viewer=False",
+        "smp_backend=STDThread",
+        "compiler_cache=None",
+        "unity_build=False",
+        "unity_batch_size=16",
+        "optimization=none",
+        "cpu_target=baseline",
+        "compile_jobs=None",
+        "link_jobs=None",
+        "build_debug=True",
+        "debug_info=keep",
+        "qt_modules=GUISupportQt,RenderingQt,ViewsQt",
+        "modules=default",
+        "rendering_backend=x11",
     )
 
     short_paths = True
@@ -57,14 +312,150 @@ class VTKConan(ConanFile):
     version_split = version.split(".")
     short_version = "%s.%s" % (version_split[0], version_split[1])
 
-    def source(self):
-        tools.get(
-            "https://github.com/Kitware/{0}/archive/v{1}.tar.gz".format(
-                self.name.upper(), self.version
-            )
+    # SHA-256 of the release archive, VTK_SOURCE_SHA256 overrides it
+    source_sha256 = "8fed42f4f8f1eb8083107b68eaa9ad71da07110161a3116ad807f43e5ca5ce96"
+
+    @property
+    def _source_url(self):
+        # The release archive, unlike GitHub's generated archives, has a
+        # stable hash
+        return "https://www.vtk.org/files/release/{0}/{1}".format(
+            self.short_version, self._source_archive
         )
+
+    @property
+    def _source_archive(self):
+        return "%s-%s.tar.gz" % (self.name.upper(), self.version)
+
+    @property
+    def _expected_sha256(self):
+        return (tools.get_env("VTK_SOURCE_SHA256") or self.source_sha256).lower()
+
+    @staticmethod
+    def _sha256(file_path):
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _fetch_source_archive(self, destination):
+        """Copy the source archive from VTK_SOURCE_MIRROR if it is there,
+        download it otherwise. Both are checked against the expected SHA-256,
+        a mirror copy that doesn't match is replaced by a download.
+
+        Returns:
+            str: SHA-256 of the archive
+        """
+        expected = self._expected_sha256
+        mirror = tools.get_env("VTK_SOURCE_MIRROR")
+        mirrored = mirror and os.path.join(mirror, self._source_archive)
+        if mirrored and os.path.isfile(mirrored):
+            self.output.info("Using source archive from mirror %s" % mirror)
+            shutil.copy2(mirrored, destination)
+            if self._sha256(destination) == expected:
+                return expected
+            self.output.warn(
+                "SHA-256 of %s does not match %s, downloading" % (mirrored, expected)
+            )
+            os.unlink(destination)
+        tools.download(self._source_url, destination)
+        sha256 = self._sha256(destination)
+        if sha256 != expected:
+            os.unlink(destination)
+            raise ConanException(
+                "SHA-256 of %s is %s, expected %s"
+                % (self._source_archive, sha256, expected)
+            )
+        return sha256
+
+    def _cached_source_tree(self, cache):
+        """Return the extracted source tree from the content addressed cache,
+        filling the cache first if needed.
+
+        Layout of the cache folder:
+            archives/<sha256>.tar.gz  source archives
+            trees/<sha256>/           extracted archives
+            index.json                source url to sha256
+
+        Only archives matching the expected SHA-256 are extracted, so a tree
+        in the cache always comes from a verified archive.
+
+        Args:
+            cache (str): the cache folder (VTK_SOURCE_CACHE)
+
+        Returns:
+            str: the extracted top level folder of the archive
+        """
         extracted_dir = self.name.upper() + "-" + self.version
-        os.rename(extracted_dir, self.source_subfolder)
+        index_file = os.path.join(cache, "index.json")
+        index = {}
+        if os.path.isfile(index_file):
+            with open(index_file) as file:
+                index = json.load(file)
+
+        sha256 = self._expected_sha256
+        tree = os.path.join(cache, "trees", sha256, extracted_dir)
+        if os.path.isdir(tree):
+            self.output.info("Using cached source tree %s" % sha256)
+            return tree
+
+        archive = os.path.join(cache, "archives", sha256 + ".tar.gz")
+        if os.path.isfile(archive) and self._sha256(archive) != sha256:
+            self.output.warn(
+                "Cached source archive %s is corrupt, fetching it again" % archive
+            )
+            os.unlink(archive)
+        if not os.path.isfile(archive):
+            tools.mkdir(os.path.join(cache, "archives"))
+            download = os.path.join(
+                cache, "archives", "%s.%d.part" % (sha256, os.getpid())
+            )
+            self._fetch_source_archive(download)
+            os.replace(download, archive)
+
+        # Extract next to the final location and rename, so concurrent builds
+        # never see a partial tree
+        trees = os.path.join(cache, "trees")
+        tools.mkdir(trees)
+        staging = tempfile.mkdtemp(prefix=sha256 + ".", dir=trees)
+        tools.unzip(archive, staging)
+        try:
+            os.rename(staging, os.path.join(trees, sha256))
+        except OSError:
+            # Another build extracted it first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        index[self._source_url] = sha256
+        with open(index_file + ".%d" % os.getpid(), "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(index_file + ".%d" % os.getpid(), index_file)
+        return os.path.join(trees, sha256, extracted_dir)
+
+    @timed_phase("source")
+    def source(self):
+        cache = tools.get_env("VTK_SOURCE_CACHE")
+        if cache:
+            # Hard links make a warm cache cost seconds. The tree is never
+            # patched in place, conan copies it to the build folder.
+            def link_or_copy(src, dst):
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
+
+            shutil.copytree(
+                self._cached_source_tree(cache),
+                self.source_subfolder,
+                symlinks=True,
+                copy_function=link_or_copy,
+            )
+        else:
+            self._fetch_source_archive(self._source_archive)
+            tools.unzip(self._source_archive)
+            os.unlink(self._source_archive)
+            extracted_dir = self.name.upper() + "-" + self.version
+            os.rename(extracted_dir, self.source_subfolder)
         # tools.patch(
         #    base_path=self.source_subfolder, patch_file="vtknetcdf_snprintf.diff"
         # )
@@ -78,6 +469,8 @@ class VTKConan(ConanFile):
             # self.options["qt"].shared = True
             if tools.os_info.is_linux:
                 self.options["qt"].qtx11extras = True
+        if self.options.smp_backend == "TBB":
+            self.requires("onetbb/2020.3")
 
     def _system_package_architecture(self):
         if tools.os_info.with_apt:
@@ -97,17 +490,8 @@ class VTKConan(ConanFile):
         pack_names = None
         if not self.options.minimal and tools.os_info.is_linux:
             if tools.os_info.with_apt:
-                pack_names = [
-                    "freeglut3-dev",
-                    "mesa-common-dev",
-                    "mesa-utils-extra",
-                    "libgl1-mesa-dev",
-                    "libglapi-mesa",
-                    "libsm-dev",
-                    "libx11-dev",
-                    "libxext-dev",
-                    "libxt-dev",
-                    "libglu1-mesa-dev",
+                pack_names = self._rendering_packages[
+                    str(self.options.get_safe("rendering_backend", "x11"))
                 ]
 
         if pack_names:
@@ -115,9 +499,365 @@ class VTKConan(ConanFile):
             for item in pack_names:
                 installer.install(item + self._system_package_architecture())
 
+    # apt packages needed by each rendering backend
+    _rendering_packages = {
+        "x11": [
+            "freeglut3-dev",
+            "mesa-common-dev",
+            "mesa-utils-extra",
+            "libgl1-mesa-dev",
+            "libglapi-mesa",
+            "libsm-dev",
+            "libx11-dev",
+            "libxext-dev",
+            "libxt-dev",
+            "libglu1-mesa-dev",
+        ],
+        # OSMesa renders on the CPU (llvmpipe), no GPU or display needed
+        "osmesa": ["libosmesa6-dev", "mesa-common-dev"],
+        "egl": ["libegl1-mesa-dev", "libgl1-mesa-dev", "mesa-common-dev"],
+    }
+
     def config_options(self):
         if self.settings.compiler == "Visual Studio":
             del self.options.fPIC
+        # Offscreen backends are only offered for Linux
+        if self.settings.os != "Linux":
+            del self.options.rendering_backend
+
+    def validate(self):
+        unknown = set(self._selected_qt_modules) - set(self._vtk_qt_modules)
+        if self.options.qt and unknown:
+            raise ConanInvalidConfiguration(
+                "Unknown qt_modules %s, choose from %s"
+                % (", ".join(sorted(unknown)), ", ".join(self._vtk_qt_modules))
+            )
+        if self.options.cpu_target != "baseline" and self.settings.arch not in (
+            "x86",
+            "x86_64",
+        ):
+            raise ConanInvalidConfiguration("cpu_target only applies to x86 targets")
+        # MSVC has no /arch level between SSE2 and AVX
+        if (
+            self.options.cpu_target in ("native", "x86-64-v2")
+            and self.settings.compiler == "Visual Studio"
+        ):
+            raise ConanInvalidConfiguration(
+                "cpu_target=%s is not supported with Visual Studio"
+                % self.options.cpu_target
+            )
+        if self.options.optimization == "pgo" and self.settings.compiler not in (
+            "gcc",
+            "clang",
+            "apple-clang",
+        ):
+            raise ConanInvalidConfiguration(
+                "optimization=pgo is only supported with gcc and clang"
+            )
+        # The launchers are only honoured by the Ninja generator
+        if self.options.compiler_cache and self.settings.os != "Linux":
+            raise ConanInvalidConfiguration(
+                "compiler_cache is only supported on Linux (Ninja Multi-Config)"
+            )
+        # Checked here, the pool sizes are only worked out in generate()
+        for option, env_var in (
+            ("compile_jobs", "VTK_COMPILE_JOBS"),
+            ("link_jobs", "VTK_LINK_JOBS"),
+        ):
+            name, value = option, self.options.get_safe(option)
+            if value is None or str(value) == "None":
+                name, value = env_var, tools.get_env(env_var)
+            if value and not str(value).isdigit():
+                raise ConanInvalidConfiguration(
+                    "%s must be an integer number of jobs, got '%s'" % (name, value)
+                )
+        if not str(self.options.unity_batch_size).isdigit():
+            raise ConanInvalidConfiguration(
+                "unity_batch_size must be a non-negative integer (0 means unlimited)"
+            )
+        if self.options.qt and self._headless:
+            raise ConanInvalidConfiguration(
+                "qt=True needs rendering_backend=x11, %s has no on-screen windows"
+                % self.options.rendering_backend
+            )
+        if tools.get_env("VTK_DEV_BUILD_DIR"):
+            if self.settings.os != "Linux":
+                self.output.warn(
+                    "VTK_DEV_BUILD_DIR is only supported with Ninja (Linux), ignored"
+                )
+            elif self.options.optimization == "pgo":
+                raise ConanInvalidConfiguration(
+                    "optimization=pgo rebuilds the whole tree, it can't be used "
+                    "with VTK_DEV_BUILD_DIR"
+                )
+        # Apple clang ships without an OpenMP runtime
+        if (
+            self.options.smp_backend == "OpenMP"
+            and self.settings.compiler == "apple-clang"
+        ):
+            raise ConanInvalidConfiguration(
+                "smp_backend=OpenMP is not supported with apple-clang, use STDThread or TBB"
+            )
+
+    # VTK Qt modules and the Qt modules they need
+    _vtk_qt_modules = {
+        "GUISupportQt": ("Qt5Core", "Qt5Gui", "Qt5Widgets"),
+        "GUISupportQtQuick": ("Qt5Core", "Qt5Gui", "Qt5Quick", "Qt5Qml"),
+        "GUISupportQtSQL": ("Qt5Core", "Qt5Sql"),
+        "RenderingQt": ("Qt5Core", "Qt5Gui", "Qt5Widgets"),
+        "ViewsQt": ("Qt5Core", "Qt5Gui", "Qt5Widgets"),
+    }
+
+    @property
+    def _selected_qt_modules(self):
+        return [
+            module.strip()
+            for module in str(self.options.qt_modules).split(",")
+            if module.strip()
+        ]
+
+    def _qt_required_modules(self):
+        required = set()
+        for vtk_module in self._selected_qt_modules:
+            required.update(self._vtk_qt_modules[vtk_module])
+        return sorted(required)
+
+    @property
+    def _qt_index_file(self):
+        home = tools.get_env("CONAN_USER_HOME", os.path.expanduser("~"))
+        return os.path.join(home, ".conan", "vtk_qt_cmake_index.json")
+
+    def _qt_cmake_dirs(self):
+        """Locate the Qt5*Config.cmake dirs in the Qt package.
+
+        The Qt package's own lib dirs are checked first (<libdir>/cmake/Qt5*).
+        Packages with another layout are searched once and the result is
+        cached in an index keyed by the Qt package folder, which is unique
+        per Qt reference and package id.
+
+        Returns:
+            dict: Qt CMake package name (e.g. Qt5Widgets) to its config dir
+        """
+        qt = self.deps_cpp_info["qt"]
+        rootpath = qt.rootpath
+
+        def config_dirs(config_files):
+            dirs = {}
+            for config in config_files:
+                name = config.name[: -len("Config.cmake")]
+                dirs[name] = str(config.parent).replace("\\", "/")
+            return dirs
+
+        dirs = {}
+        for libdir in qt.libdirs:
+            dirs.update(
+                config_dirs(Path(rootpath, libdir).glob("cmake/Qt5*/Qt5*Config.cmake"))
+            )
+
+        if "Qt5" not in dirs:
+            index = {}
+            try:
+                with open(self._qt_index_file) as file:
+                    index = json.load(file)
+            except (IOError, ValueError):
+                pass  # missing or unreadable, rebuilt below
+            dirs = index.get(rootpath)
+            if dirs is None or not all(os.path.isdir(d) for d in dirs.values()):
+                self.output.info("Indexing Qt CMake files in %s" % rootpath)
+                dirs = config_dirs(Path(rootpath).glob("**/Qt5*Config.cmake"))
+                index[rootpath] = dirs
+                tools.mkdir(os.path.dirname(self._qt_index_file))
+                # Concurrent builds share the index, never leave it half written
+                staging = self._qt_index_file + ".%d" % os.getpid()
+                with open(staging, "w") as file:
+                    json.dump(index, file, indent=2)
+                os.replace(staging, self._qt_index_file)
+
+        missing = [
+            module
+            for module in ["Qt5"] + self._qt_required_modules()
+            if module not in dirs
+        ]
+        if missing:
+            raise ConanException(
+                "The Qt package in %s has no CMake config for %s, needed by "
+                "qt_modules=%s"
+                % (rootpath, ", ".join(missing), self.options.qt_modules)
+            )
+        return dirs
+
+    _vtk_groups = ("Imaging", "MPI", "Qt", "Rendering", "StandAlone", "Views", "Web")
+
+    # Modules wanted by the older per module options
+    _option_modules = {
+        "ioxml": ("IOXML",),
+        "ioexport": ("IOExport",),
+        "ioxdmf3": ("IOXdmf3",),
+        "iolegacy": ("IOLegacy",),
+        "mpi": ("IOParallelXML",),
+        "mpi_minimal": ("IOParallelXML", "ParallelMPI"),
+    }
+
+    @property
+    def _modules_selection(self):
+        """Profile names and module names in the modules option. The
+        basic_viewer option is the basic_viewer profile.
+        """
+        selection = [token.strip() for token in str(self.options.modules).split(",")]
+        selection = [token for token in selection if token and token != "default"]
+        if self.options.basic_viewer and "basic_viewer" not in selection:
+            selection.append("basic_viewer")
+        return selection
+
+    def _load_module_profiles(self):
+        with open(os.path.join(self.source_folder, "modules", "profiles.json")) as file:
+            return json.load(file)
+
+    def _scan_vtk_modules(self):
+        """Read the vtk.module files of the VTK source tree.
+
+        Returns:
+            dict: module name without the VTK:: namespace to a dict with its
+            folder and parsed vtk.module keywords
+        """
+        modules = {}
+        root = os.path.join(self.source_folder, self.source_subfolder)
+        for path, subdirs, names in os.walk(root):
+            subdirs[:] = [d for d in subdirs if d not in ("Testing", "Examples")]
+            if "vtk.module" in names:
+                module = _parse_vtk_module(os.path.join(path, "vtk.module"))
+                name = module.get("NAME", [""])[0].split("::", 1)[-1]
+                if name:
+                    modules[name] = dict(module, folder=path)
+        return modules
+
+    @staticmethod
+    def _expand_profiles(selection, profiles):
+        """Replace profile names by their modules and collect the extra CMake
+        variables of the profiles.
+
+        Returns:
+            tuple(set, dict): module names and CMake variables
+        """
+        wanted, variables = set(), {}
+
+        def expand(token):
+            if token in profiles:
+                for included in profiles[token].get("includes", []):
+                    expand(included)
+                wanted.update(profiles[token]["modules"])
+                variables.update(profiles[token].get("variables", {}))
+            else:
+                wanted.add(token)
+
+        for token in selection:
+            expand(token)
+        return wanted, variables
+
+    @staticmethod
+    def _module_closure(wanted, modules):
+        """The wanted modules and everything they depend on, publicly or
+        privately, according to their vtk.module files.
+        """
+        closure, pending = set(), list(wanted)
+        while pending:
+            name = pending.pop()
+            if name in closure:
+                continue
+            closure.add(name)
+            for keyword in ("DEPENDS", "PRIVATE_DEPENDS"):
+                for dep in modules[name].get(keyword, []):
+                    dep = dep.split("::", 1)[-1]
+                    if dep in modules and dep not in closure:
+                        pending.append(dep)
+        return closure
+
+    @staticmethod
+    def _translation_units(folder):
+        count = 0
+        for path, subdirs, names in os.walk(folder):
+            subdirs[:] = [d for d in subdirs if d != "Testing"]
+            count += sum(1 for name in names if name.endswith((".c", ".cxx", ".cpp")))
+        return count
+
+    def _write_module_report(self, selected, profiles, modules):
+        """Write modules_report.json to the build folder with the number of
+        modules and translation units of every profile, of the selection
+        being built and of the whole VTK source tree.
+        """
+        units = {
+            name: self._translation_units(module["folder"])
+            for name, module in modules.items()
+        }
+
+        def counts(closure):
+            return {
+                "modules": len(closure),
+                "translation_units": sum(units[module] for module in closure),
+            }
+
+        report = {"profiles": {}}
+        for name in profiles:
+            wanted, _ = self._expand_profiles([name], profiles)
+            report["profiles"][name] = counts(self._module_closure(wanted, modules))
+        report["selected"] = dict(
+            counts(selected), modules_option=",".join(self._modules_selection)
+        )
+        report["all"] = counts(modules)
+        with open(os.path.join(self.build_folder, "modules_report.json"), "w") as file:
+            json.dump(report, file, indent=2)
+        for name, stats in list(report["profiles"].items()) + [
+            ("selected", report["selected"]),
+            ("all", report["all"]),
+        ]:
+            self.output.info(
+                "Modules %s: %d modules, %d translation units"
+                % (name, stats["modules"], stats["translation_units"])
+            )
+
+    def _configure_modules(self, tc):
+        """Select the VTK modules to build.
+
+        Without a profile (modules=default) VTK's own defaults apply and the
+        per module options only switch their modules on. With profiles or
+        module names in the modules option, exactly the dependency closure of
+        the selection is built and every other module is disabled.
+        """
+        selection = self._modules_selection
+        if not selection:
+            for option, option_modules in self._option_modules.items():
+                if self.options.get_safe(option):
+                    for module in option_modules:
+                        tc.variables["VTK_MODULE_ENABLE_VTK_%s" % module] = "YES"
+            return
+
+        profiles = self._load_module_profiles()
+        modules = self._scan_vtk_modules()
+        wanted, variables = self._expand_profiles(selection, profiles)
+        for option, option_modules in self._option_modules.items():
+            if self.options.get_safe(option):
+                wanted.update(option_modules)
+        if self.options.qt:
+            wanted.update(self._selected_qt_modules)
+        unknown = sorted(wanted - set(modules))
+        if unknown:
+            raise ConanException(
+                "modules=%s: unknown profiles or VTK modules %s (profiles: %s)"
+                % (self.options.modules, ", ".join(unknown), ", ".join(profiles))
+            )
+        closure = self._module_closure(wanted, modules)
+        for name, value in variables.items():
+            tc.variables[name] = value
+        tc.variables["VTK_BUILD_ALL_MODULES"] = "OFF"
+        for group in self._vtk_groups:
+            tc.variables["VTK_GROUP_ENABLE_%s" % group] = "DONT_WANT"
+        for name, module in modules.items():
+            # Third party modules follow the modules that use them
+            if "THIRD_PARTY" not in module:
+                tc.variables["VTK_MODULE_ENABLE_VTK_%s" % name] = (
+                    "YES" if name in closure else "NO"
+                )
+        self._write_module_report(closure, profiles, modules)
 
     def _get_tc(self):
         """Generate the CMake configuration using
@@ -144,185 +884,113 @@ class VTKConan(ConanFile):
         tc.variables["BUILD_EXAMPLES"] = "OFF"
         tc.variables["BUILD_SHARED_LIBS"] = "TRUE" if self.options.shared else "FALSE"
 
-        # Locat qt and add path to cmake prefix to allow lib discovery
-        qtpath = Path(self.deps_cpp_info["qt"].rootpath)
-        qt_root = str(list(qtpath.glob("**/Qt5Config.cmake"))[0].parents[3]).replace(
-            "\\", "/"
-        )
-        tc.variables["CMAKE_PREFIX_PATH"] = qt_root
-        print("Qt root ", qt_root)
-
-        if self.options.basic_viewer:
-            tc.variables["VTK_Group_StandAlone"] = "OFF"
-            tc.variables["VTK_Group_Rendering"] = "OFF"
-            tc.variables["VTK_ENABLE_WRAPPING"] = "OFF"
-            tc.variables["VTK_MODULE_ENABLE_VTK_AcceleratorsVTKmCore"] = "DONT_WANT"
-            tc.variables[
-                "VTK_MODULE_ENABLE_VTK_AcceleratorsVTKmDataModel"
-            ] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_AcceleratorsVTKmFilters"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_DomainsChemistry"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_DomainsChemistryOpenGL2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_DomainsMicroscopy"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_DomainsParallelChemistry"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersAMR"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersFlowPaths"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersGeneric"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersHyperTree"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersOpenTURNS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelDIY2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelFlowPaths"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelGeometry"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelImaging"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelMPI"] = "DONT_WANT"
-            tc.variables[
-                "VTK_MODULE_ENABLE_VTK_FiltersParallelStatistics"
-            ] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersParallelVerdict"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersPoints"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersProgrammable"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersReebGraph"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersSMP"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersSelection"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersTopology"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_FiltersVerdict"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GUISupportMFC"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GeovisCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GeovisGDAL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOADIOS2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOAMR"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOAsynchronous"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOCGNSReader"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOCONVERGECFD"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOChemistry"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOCityGML"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOEnSight"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOExodus"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOExport"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOExportGL2PS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOExportPDF"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOFFMPEG"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOFides"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOGDAL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOGeoJSON"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOGeometry"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOH5Rage"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOH5part"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOHDF"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOIOSS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOImport"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOInfovis"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOLAS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOLSDyna"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOLegacy"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOMINC"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOMPIImage"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOMotionFX"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOMovie"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOMySQL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IONetCDF"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOODBC"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOOMF"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOOggTheora"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOOpenVDB"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOPDAL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOPIO"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOPLY"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallel"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallelExodus"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallelLSDyna"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallelNetCDF"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallelXML"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOParallelXdmf3"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOPostgreSQL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOSQL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOSegY"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOTRUCHAS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOTecplotTable"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOVPIC"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOVeraOut"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOVideo"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOXdmf2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_IOXdmf3"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingFourier"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingHybrid"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingMorphological"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingOpenGL2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingSources"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ImagingStencil"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_InfovisBoost"] = "DONT_WANT"
-            tc.variables[
-                "VTK_MODULE_ENABLE_VTK_InfovisBoostGraphAlgorithms"
-            ] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_InfovisCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_InfovisLayout"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ParallelCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ParallelDIY"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ParallelMPI"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_PythonInterpreter"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingExternal"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingFFMPEGOpenGL2"] = "DONT_WANT"
-            tc.variables[
-                "VTK_MODULE_ENABLE_VTK_RenderingFreeTypeFontConfig"
-            ] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingImage"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingLICOpenGL2"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingLOD"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingLabel"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingMatplotlib"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingOpenVR"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingParallel"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingParallelLIC"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingRayTracing"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingSceneGraph"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingVR"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingVolumeAMR"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingVtkJS"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_TestingCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_TestingGenericBridge"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_TestingIOSQL"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_TestingRendering"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_UtilitiesBenchmarks"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ViewsContext2D"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_WebCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_WebGLExporter"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_WrappingPythonCore"] = "DONT_WANT"
-            tc.variables["VTK_MODULE_ENABLE_VTK_WrappingTools"] = "DONT_WANT"
-
         if self.options.minimal:
-            tc.variables["VTK_Group_StandAlone"] = "OFF"
-            tc.variables["VTK_Group_Rendering"] = "OFF"
-        if self.options.ioxml:
-            tc.variables["Module_vtkIOXML"] = "ON"
-        if self.options.ioexport:
-            tc.variables["Module_vtkIOExport"] = "ON"
-        if self.options.ioxdmf3:
-            tc.variables["Module_vtkIOXdmf3"] = "ON"
-        if self.options.iolegacy:
-            tc.variables["Module_vtkIOLegacy"] = "ON"
-            # if tools.os_info.is_macos:
-            # cmake.definitions["VTK_USE_SYSTEM_LIBXML2"] = "ON"
+            tc.variables["VTK_GROUP_ENABLE_StandAlone"] = "DONT_WANT"
+            tc.variables["VTK_GROUP_ENABLE_Rendering"] = "DONT_WANT"
         if self.options.qt:
+            # Add the Qt prefix and the config dirs of the Qt modules that
+            # the selected VTK Qt modules need
+            qt_dirs = self._qt_cmake_dirs()
+            qt_root = str(Path(qt_dirs["Qt5"]).parents[2]).replace("\\", "/")
+            tc.variables["CMAKE_PREFIX_PATH"] = qt_root
+            self.output.info("Qt root %s" % qt_root)
+            tc.variables["Qt5_DIR"] = qt_dirs["Qt5"]
+            for qt_module in self._qt_required_modules():
+                tc.variables["%s_DIR" % qt_module] = qt_dirs[qt_module]
+
             tc.variables["VTK_GROUP_ENABLE_Qt"] = "YES"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GUISupportQt"] = "YES"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GUISupportQtQuick"] = "NO"
-            tc.variables["VTK_MODULE_ENABLE_VTK_GUISupportQtSQL"] = "NO"
-            tc.variables["VTK_MODULE_ENABLE_VTK_RenderingQt"] = "YES"
-            tc.variables["VTK_MODULE_ENABLE_VTK_ViewsQt"] = "YES"
+            for vtk_module in self._vtk_qt_modules:
+                tc.variables["VTK_MODULE_ENABLE_VTK_%s" % vtk_module] = (
+                    "YES" if vtk_module in self._selected_qt_modules else "NO"
+                )
             tc.variables["VTK_QT_VERSION"] = "5"
             tc.variables["VTK_BUILD_QT_DESIGNER_PLUGIN"] = "OFF"
         if self.options.mpi:
-            tc.variables["VTK_Group_MPI"] = "ON"
-            tc.variables["Module_vtkIOParallelXML"] = "ON"
-        if self.options.mpi_minimal:
-            tc.variables["Module_vtkIOParallelXML"] = "ON"
-            tc.variables["Module_vtkParallelMPI"] = "ON"
+            tc.variables["VTK_GROUP_ENABLE_MPI"] = "YES"
+        if self.options.mpi or self.options.mpi_minimal:
+            tc.variables["VTK_USE_MPI"] = "ON"
 
-        if (
-            self.settings.build_type == "Debug"
-            and self.settings.compiler == "Visual Studio"
-        ):
+        self._configure_modules(tc)
+
+        # OpenGL context creation: X11 windows, or headless through OSMesa
+        # (software, CPU only) or EGL (GPU, no display server)
+        rendering_backend = self.options.get_safe("rendering_backend")
+        if rendering_backend is not None and not self.options.minimal:
+            tc.variables["VTK_USE_X"] = "ON" if rendering_backend == "x11" else "OFF"
+            tc.variables["VTK_OPENGL_HAS_OSMESA"] = (
+                "ON" if rendering_backend == "osmesa" else "OFF"
+            )
+            tc.variables["VTK_OPENGL_HAS_EGL"] = (
+                "ON" if rendering_backend == "egl" else "OFF"
+            )
+            if rendering_backend == "osmesa":
+                tc.variables["VTK_DEFAULT_RENDER_WINDOW_OFFSCREEN"] = "ON"
+
+        # SMP backend used by vtkSMPTools (contour, transforms, locators, ...)
+        smp_backend = str(self.options.smp_backend)
+        tc.variables["VTK_SMP_IMPLEMENTATION_TYPE"] = smp_backend
+        if smp_backend != "Sequential":
+            tc.variables["VTK_SMP_ENABLE_%s" % smp_backend.upper()] = "ON"
+
+        compile_launcher = []
+        if self.options.compiler_cache:
+            # Only honoured by the Ninja and Makefile generators
+            compile_launcher = [self._compiler_cache_program()]
+
+        if generator == "Ninja Multi-Config":
+            # Separate pools keep the memory hungry links from running at full
+            # compile parallelism. Every job goes through a launcher that logs
+            # its peak RSS so the pool sizes can be tuned.
+            compile_jobs, link_jobs = self._ninja_pool_sizes()
+            tc.variables["CMAKE_JOB_POOLS"] = "compile=%d;link=%d" % (
+                compile_jobs,
+                link_jobs,
+            )
+            tc.variables["CMAKE_JOB_POOL_COMPILE"] = "compile"
+            tc.variables["CMAKE_JOB_POOL_LINK"] = "link"
+            rss_launcher = [
+                sys.executable.replace("\\", "/"),
+                self._pool_rss_script,
+                self._pool_rss_log,
+            ]
+            compile_launcher = rss_launcher + ["compile"] + compile_launcher
+            # Needs CMake >= 3.21, older versions ignore it
+            for lang in ("C", "CXX"):
+                tc.variables["CMAKE_%s_LINKER_LAUNCHER" % lang] = ";".join(
+                    rss_launcher + ["link"]
+                )
+
+        if compile_launcher:
+            for lang in ("C", "CXX"):
+                tc.variables["CMAKE_%s_COMPILER_LAUNCHER" % lang] = ";".join(
+                    compile_launcher
+                )
+
+        if self.options.unity_build:
+            # VTK 9.1 does not declare precompiled headers for its modules, so
+            # unity batches are the way to cut repeated header parsing.
+            tc.variables["CMAKE_UNITY_BUILD"] = "ON"
+            tc.variables["CMAKE_UNITY_BUILD_BATCH_SIZE"] = str(
+                self.options.unity_batch_size
+            )
+
+        if self.options.optimization == "lto":
+            # CMake picks -flto=thin for clang and -flto for gcc/MSVC /GL
+            tc.variables["CMAKE_INTERPROCEDURAL_OPTIMIZATION"] = "ON"
+
+        # Debug and Release are built from the same tree
+        if self.settings.compiler == "Visual Studio":
             tc.variables["CMAKE_DEBUG_POSTFIX"] = "_d"
+            # The toolchain only sets the runtime of the profile build_type,
+            # both configurations get the runtime family of the profile
+            tc.blocks.remove("vs_runtime")
+            runtime = str(self.settings.compiler.runtime)
+            tc.variables["CMAKE_POLICY_DEFAULT_CMP0091"] = "NEW"
+            tc.variables[
+                "CMAKE_MSVC_RUNTIME_LIBRARY"
+            ] = "MultiThreaded$<$<CONFIG:Debug>:Debug>%s" % (
+                "DLL" if runtime.startswith("MD") else ""
+            )
 
         if self.settings.os == "Macos":
             self.env["DYLD_LIBRARY_PATH"] = os.path.join(self.build_folder, "lib")
@@ -330,30 +998,235 @@ class VTKConan(ConanFile):
 
         tc.variables["CMAKE_TOOLCHAIN_FILE"] = "conan_toolchain.cmake"
         tc.variables["CMAKE_INSTALL_PREFIX"] = str(
-            Path(self.build_folder, "install")
+            Path(self._dev_build_root or self.build_folder, "install")
         ).replace("\\", "/")
 
-        if self.settings.os == "Linux":
-            tc.variables["CMAKE_CONFIGURATION_TYPES"] = "Debug;Release"
+        tc.variables["CMAKE_CONFIGURATION_TYPES"] = ";".join(self._build_types)
+        if generator == "Ninja Multi-Config":
+            # A plain "cmake --build" then builds every configuration in one
+            # ninja run, sharing the job pools and the generated sources
+            tc.variables["CMAKE_CROSS_CONFIGS"] = "all"
+            tc.variables["CMAKE_DEFAULT_CONFIGS"] = "all"
 
         return tc
 
+    # Instruction set extensions of the x86-64 psABI micro-architecture levels
+    _x86_64_v2_flags = ["-mssse3", "-msse4.1", "-msse4.2", "-mpopcnt", "-mcx16"]
+    _x86_64_v3_flags = _x86_64_v2_flags + [
+        "-mavx",
+        "-mavx2",
+        "-mbmi",
+        "-mbmi2",
+        "-mfma",
+        "-mf16c",
+        "-mlzcnt",
+        "-mmovbe",
+    ]
+
+    def _cpu_target_flags(self):
+        """Compiler flags for the cpu_target option.
+
+        Explicit extension flags are used instead of -march=x86-64-vN so that
+        compilers older than gcc 11 / clang 12 are supported, and tuning is
+        left at the compiler default.
+
+        Returns:
+            list: compiler flags
+        """
+        target = str(self.options.cpu_target)
+        if target == "baseline":
+            return []
+        if self.settings.compiler == "Visual Studio":
+            # x86-64-v3, validate() rejects the levels MSVC can't target
+            return ["/arch:AVX2"]
+        if target == "native":
+            return ["-march=native"]
+        if target == "x86-64-v2":
+            return self._x86_64_v2_flags
+        return self._x86_64_v3_flags
+
+    def _section_flags(self):
+        """Put every function and data item of static builds in its own
+        section, so consumers can drop the unused ones at link time.
+        """
+        if self.options.shared:
+            return []
+        if self.settings.compiler == "Visual Studio":
+            return ["/Gy", "/Gw"]
+        return ["-ffunction-sections", "-fdata-sections"]
+
+    def _compile_flags_env(self):
+        """Extra compile flags, passed through the environment so that CMake
+        adds them to CMAKE_<LANG>_FLAGS on top of the toolchain flags.
+
+        Returns:
+            dict: CFLAGS and CXXFLAGS
+        """
+        flags = self._cpu_target_flags() + self._section_flags()
+        if not flags:
+            return {}
+        return {
+            var: " ".join([tools.get_env(var, "")] + flags).strip()
+            for var in ("CFLAGS", "CXXFLAGS")
+        }
+
+    @timed_phase("generate")
     def generate(self):
-        print("In generate")
         tc = self._get_tc()
         tc.generate()
         deps = CMakeDeps(self)
         deps.generate()
 
+    @timed_phase("configure")
     def _configure_cmake(self):
+        if self._dev_build_root:
+            self._configure_dev_tree()
+            return None
         cmake = CMake(self)
-        print(f"source path {str(PureWindowsPath(self.source_subfolder))}")
         cmake.configure(
             build_script_folder="vtk"
         )  # build_script_folder=str(PureWindowsPath(self.source_subfolder))
         return cmake
 
-    def _do_build(self, cmake, build_type):
+    @property
+    def _dev_build_root(self):
+        """Persistent build dir of the developer mode, None when it is off.
+
+        Set VTK_DEV_BUILD_DIR to keep one VTK build tree per compiler, arch
+        and binary compatible variant outside the conan cache, which is
+        reconfigured in place so that Ninja only rebuilds what changed.
+        """
+        root = tools.get_env("VTK_DEV_BUILD_DIR")
+        if not root or self.settings.os != "Linux":
+            return None
+        key = [
+            self.settings.os,
+            self.settings.compiler,
+            self.settings.compiler.version,
+            self.settings.get_safe("compiler.libcxx"),
+            self.settings.arch,
+            "shared" if self.options.shared else "static",
+            self.options.cpu_target,
+            self.options.optimization,
+        ]
+        return os.path.join(
+            root, "vtk-%s" % self.version, "-".join(str(k) for k in key if k)
+        )
+
+    @property
+    def _vtk_build_folder(self):
+        """Binary dir of the VTK build, the persistent tree in developer mode"""
+        root = self._dev_build_root
+        return os.path.join(root, "build") if root else self.build_folder
+
+    def _configure_dev_tree(self):
+        """Configure the persistent build tree of the developer mode in place.
+
+        The cache variables of _get_tc() are passed on the command line, so
+        they override the values of the previous run, and variables that
+        were set by the previous run but not by this one are unset to get
+        VTK's defaults back.
+        """
+        root = self._dev_build_root
+        self.output.info("Developer mode, building in %s" % root)
+        source_dir = os.path.join(root, "source")
+        if not os.path.isdir(source_dir):
+            # Copied once, later runs must not touch the source timestamps
+            shutil.copytree(
+                os.path.join(self.source_folder, "vtk"), source_dir, symlinks=True
+            )
+        # Stable generators folder: CMake only reads the toolchain file that
+        # the tree was first configured with, and the toolchain looks up the
+        # CMakeDeps config files next to itself
+        generators_dir = self._sync_dev_generators(os.path.join(root, "generators"))
+        toolchain = os.path.join(generators_dir, "conan_toolchain.cmake")
+        shutil.copy2(
+            os.path.join(self.source_folder, "scripts", "ninja_pool_rss.py"),
+            self._pool_rss_script,
+        )
+        # Only the jobs of this build
+        if os.path.isfile(self._pool_rss_log):
+            os.remove(self._pool_rss_log)
+
+        variables = {
+            name: str(value) for name, value in self._get_tc().variables.items()
+        }
+        variables["CMAKE_TOOLCHAIN_FILE"] = toolchain
+        state_file = os.path.join(root, "dev_state.json")
+        previous = {}
+        if os.path.isfile(state_file):
+            with open(state_file) as file:
+                previous = json.load(file)["variables"]
+        args = ['-G "Ninja Multi-Config"']
+        args += [
+            '-D%s="%s"' % (name, value.replace("\\", "/"))
+            for name, value in sorted(variables.items())
+        ]
+        args += ['-U "%s"' % name for name in sorted(set(previous) - set(variables))]
+        rules_before = ninja_rule_commands(self._vtk_build_folder)
+        self.run(
+            '"%s" -S "%s" -B "%s" %s'
+            % (
+                self._cmake_program,
+                source_dir,
+                self._vtk_build_folder,
+                " ".join(args),
+            )
+        )
+        with open(state_file, "w") as file:
+            json.dump({"variables": variables}, file, indent=2)
+
+        changed = {
+            name
+            for name in set(previous) | set(variables)
+            if previous.get(name) != variables.get(name)
+        }
+        rebuilt = changed_rule_commands(
+            rules_before, ninja_rule_commands(self._vtk_build_folder)
+        )
+        if rebuilt and changed and all(_is_module_variable(n) for n in changed):
+            self.output.warn(
+                "Only module options changed, but the commands of %d build rules "
+                "did too (e.g. %s), Ninja rebuilds their outputs"
+                % (len(rebuilt), rebuilt[0])
+            )
+
+    def _sync_dev_generators(self, generators_dir):
+        """Mirror the toolchain and CMakeDeps files of this build into the
+        generators folder of the developer mode. Unchanged files are left
+        alone and files that are no longer generated are removed.
+
+        Returns:
+            str: the generators folder
+        """
+        tools.mkdir(generators_dir)
+        generated = {
+            name
+            for name in os.listdir(self.build_folder)
+            if fnmatch(name, "*.cmake")
+            and os.path.isfile(os.path.join(self.build_folder, name))
+        }
+        for name in os.listdir(generators_dir):
+            if name not in generated:
+                os.remove(os.path.join(generators_dir, name))
+        for name in generated:
+            src = os.path.join(self.build_folder, name)
+            dst = os.path.join(generators_dir, name)
+            if not os.path.isfile(dst) or not filecmp.cmp(src, dst, shallow=False):
+                shutil.copy2(src, dst)
+        return generators_dir
+
+    @property
+    def _headless(self):
+        """True when VTK renders without a display server (OSMesa or EGL)"""
+        return self.options.get_safe("rendering_backend", "x11") != "x11"
+
+    @property
+    def _build_types(self):
+        return ["Debug", "Release"] if self.options.build_debug else ["Release"]
+
+    @timed_phase("build")
+    def _do_build(self, cmake):
         # if self.settings.os == "Macos":
         # run_environment does not work here because it appends path just from
         # requirements, not from this package itself
@@ -362,97 +1235,845 @@ class VTKConan(ConanFile):
         #    self.run(
         #        f"DYLD_LIBRARY_PATH={lib_path} cmake --build build {cmake.build_config} -j"
         #    )
-        cmake.build(build_type=build_type)
-        cmake.install(build_type=build_type)
+        if self.settings.os == "Linux":
+            # Ninja Multi-Config: all configurations in parallel in one run
+            self.run(
+                '"%s" --build "%s" --parallel %d'
+                % (self._cmake_program, self._vtk_build_folder, tools.cpu_count())
+            )
+        else:
+            # Xcode and Visual Studio have no safe way to build several
+            # configurations of one tree at the same time
+            for build_type in self._build_types:
+                cmake.build(build_type=build_type)
+        # Headers and CMake files are the same for every configuration, the
+        # per configuration libraries are packaged from the build tree
+        if self._dev_build_root:
+            self.run(
+                '"%s" --install "%s" --config Release --prefix "%s"'
+                % (self._cmake_program, self._vtk_build_folder, self.package_folder)
+            )
+        else:
+            cmake.install(build_type="Release")
 
-    def build(self):
+    # The launcher paths are part of every compile and link command, in
+    # developer mode they must not change with the package id
+    @property
+    def _pool_rss_script(self):
+        folder = self._dev_build_root or os.path.join(self.source_folder, "scripts")
+        return os.path.join(folder, "ninja_pool_rss.py").replace("\\", "/")
 
-        # Until we know exactly which vtk dlls are needed just build release
-        # cmake_debug = self._configure_cmake()
-        # self._do_build(cmake_debug, "Debug")
+    @property
+    def _pool_rss_log(self):
+        folder = self._dev_build_root or self.build_folder
+        return os.path.join(folder, "ninja_pool_rss.log").replace("\\", "/")
 
-        cmake_release = self._configure_cmake()
-        self._do_build(cmake_release, "Release")
+    def _available_memory_gib(self):
+        """Memory available for the build in GiB, None if unknown"""
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) / (1024 * 1024)
+        except (IOError, ValueError):
+            pass
+        try:
+            pages = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+            return pages / (1024**3)
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    # Rough peak memory of a VTK compile and link job in GiB
+    _compile_job_gib = 1.5
+    _link_job_gib = 4.0
+
+    def _ninja_pool_sizes(self):
+        """Sizes of the Ninja compile and link job pools.
+
+        Taken from the compile_jobs / link_jobs options, else from the
+        VTK_COMPILE_JOBS / VTK_LINK_JOBS environment variables, else worked
+        out from the core count and the available memory.
+
+        Returns:
+            tuple(int, int): compile and link pool sizes
+        """
+        cores = tools.cpu_count()
+        memory = self._available_memory_gib()
+        link_job_gib = self._link_job_gib
+        if self.options.optimization != "none":
+            # LTO / PGO links do the code generation
+            link_job_gib *= 2
+
+        def pool_size(option, env_var, job_gib):
+            value = self.options.get_safe(option)
+            if value is None or str(value) == "None":
+                value = tools.get_env(env_var)
+            if value:
+                return max(1, int(str(value)))
+            if memory is None:
+                return cores
+            return max(1, min(cores, int(memory / job_gib)))
+
+        compile_jobs = pool_size(
+            "compile_jobs", "VTK_COMPILE_JOBS", self._compile_job_gib
+        )
+        link_jobs = pool_size("link_jobs", "VTK_LINK_JOBS", link_job_gib)
+        self.output.info(
+            "Ninja job pools: compile=%d link=%d (%d cores, %s GiB available)"
+            % (
+                compile_jobs,
+                link_jobs,
+                cores,
+                "unknown" if memory is None else "%.1f" % memory,
+            )
+        )
+        return compile_jobs, link_jobs
+
+    def _pool_rss_summary(self):
+        """Peak RSS per Ninja job pool recorded by the launcher
+
+        Returns:
+            dict: pool name to job count, peak and median RSS in MiB
+        """
+        if not os.path.isfile(self._pool_rss_log):
+            return {}
+        pools = {}
+        with open(self._pool_rss_log) as log:
+            for line in log:
+                pool, _, kib = line.strip().partition("\t")
+                if kib.isdigit():
+                    pools.setdefault(pool, []).append(int(kib))
+        summary = {}
+        for pool, values in sorted(pools.items()):
+            values.sort()
+            summary[pool] = {
+                "jobs": len(values),
+                "peak_rss_mib": round(values[-1] / 1024, 1),
+                "median_rss_mib": round(values[len(values) // 2] / 1024, 1),
+            }
+        return summary
+
+    def _report_pool_rss(self):
+        for pool, stats in self._pool_rss_summary().items():
+            self.output.info(
+                "Ninja pool %s: %d jobs, peak RSS %.0f MiB, median %.0f MiB"
+                % (pool, stats["jobs"], stats["peak_rss_mib"], stats["median_rss_mib"])
+            )
+
+    def _compiler_cache_program(self):
+        program = tools.which(str(self.options.compiler_cache))
+        if not program:
+            raise ConanInvalidConfiguration(
+                "compiler_cache=%s but it is not on the PATH"
+                % self.options.compiler_cache
+            )
+        return program.replace("\\", "/")
+
+    def _compiler_cache_env(self):
+        """Environment for the compiler cache launcher.
 
-    # From https://git.ircad.fr/conan/conan-vtk/blob/stable/8.2.0-r1/conanfile.py
-    def cmake_fix_path(self, file_path, package_name):
+        The cache directory is taken from VTK_COMPILER_CACHE_DIR so it can
+        be shared between package builds. Paths are hashed relative to the
+        build folder, which differs for every package id, so that variants
+        share cache hits.
+
+        Returns:
+            dict: environment variables to set during the build
+        """
+        env = {}
+        cache_dir = tools.get_env("VTK_COMPILER_CACHE_DIR")
+        if self.options.compiler_cache == "ccache":
+            env["CCACHE_BASEDIR"] = self._vtk_build_folder
+            env["CCACHE_NOHASHDIR"] = "1"
+            if cache_dir:
+                env["CCACHE_DIR"] = cache_dir
+        elif self.options.compiler_cache == "sccache":
+            if cache_dir:
+                env["SCCACHE_DIR"] = cache_dir
+        return env
+
+    def _compiler_cache_stats(self):
+        """Hit and miss counters of the compiler cache, None if they can't be
+        read. The counters are never reset, the cache may be shared.
+
+        Returns:
+            dict: "hits" and "misses" counts
+        """
+        output = StringIO()
         try:
-            tools.replace_in_file(
-                file_path,
-                self.deps_cpp_info[package_name].rootpath.replace("\\", "/"),
-                "${CONAN_" + package_name.upper() + "_ROOT}",
-                strict=False,
-            )
-        except:
-            self.output.info("Ignoring {0}...".format(package_name))
-
-    def cmake_fix_macos_sdk_path(self, file_path):
-        # Read in the file
-        with open(file_path, "r") as file:
-            file_data = file.read()
-
-        if file_data:
-            # Replace the target string
-            file_data = re.sub(
-                # Match sdk path
-                r";/Applications/Xcode\.app/Contents/Developer/Platforms/MacOSX\.platform/Developer/SDKs/MacOSX\d\d\.\d\d\.sdk/usr/include",
-                "",
-                file_data,
-                re.M,
-            )
-
-            # Write the file out again
-            with open(file_path, "w") as file:
-                file.write(file_data)
+            if self.options.compiler_cache == "ccache":
+                # Tab separated counters, ccache >= 4.0
+                self.run("ccache --print-stats", output=output)
+                counters = {}
+                for line in output.getvalue().splitlines():
+                    name, _, value = line.partition("\t")
+                    if value.strip().isdigit():
+                        counters[name] = int(value)
+                return {
+                    "hits": counters.get("direct_cache_hit", 0)
+                    + counters.get("preprocessed_cache_hit", 0),
+                    "misses": counters.get("cache_miss", 0),
+                }
+            self.run("sccache --show-stats --stats-format=json", output=output)
+            stats = json.loads(output.getvalue())["stats"]
+            return {
+                "hits": sum(stats["cache_hits"]["counts"].values()),
+                "misses": sum(stats["cache_misses"]["counts"].values()),
+            }
+        except (ConanException, ValueError, KeyError):
+            return None
+
+    def _report_compiler_cache(self, before):
+        """Print the hits and misses since the before snapshot"""
+        after = self._compiler_cache_stats()
+        if before is None or after is None:
+            self.output.warn("Compiler cache statistics are not available")
+            return
+        hits = after["hits"] - before["hits"]
+        misses = after["misses"] - before["misses"]
+        total = hits + misses
+        self.output.info(
+            "Compiler cache: %d hits, %d misses (%.0f%% hit rate)"
+            % (hits, misses, 100.0 * hits / total if total else 0)
+        )
+
+    @property
+    def _cmake_program(self):
+        return tools.get_env("CONAN_CMAKE_PROGRAM", "cmake")
+
+    def _cmake_reconfigure(self, variables):
+        """Re-run CMake on the existing build tree, overriding cache variables"""
+        defs = " ".join(
+            '-D%s="%s"' % (name, value) for name, value in variables.items()
+        )
+        self.run('"%s" %s "%s"' % (self._cmake_program, defs, self._vtk_build_folder))
+
+    def _build_helper_project(self, name, variables=None):
+        """Configure and build one of the small CMake projects exported with
+        the recipe (e.g. pgo) against the VTK build tree.
+
+        Args:
+            name (str): folder of the project in the source tree
+            variables (dict): extra CMake cache variables
+
+        Returns:
+            str: the binary dir of the helper project
+        """
+        binary_dir = os.path.join(self.build_folder, "%s_build" % name)
+        variables = dict(variables or {})
+        variables["CMAKE_BUILD_TYPE"] = "Release"
+        variables["CMAKE_TOOLCHAIN_FILE"] = os.path.join(
+            self.build_folder, "conan_toolchain.cmake"
+        )
+        variables["VTK_DIR"] = os.path.join(
+            self._vtk_build_folder, "lib", "cmake", "vtk-%s" % self.short_version
+        )
+        defs = " ".join(
+            '-D%s="%s"' % (key, str(value).replace("\\", "/"))
+            for key, value in variables.items()
+        )
+        self.run(
+            '"%s" -S "%s" -B "%s" %s'
+            % (
+                self._cmake_program,
+                os.path.join(self.source_folder, name),
+                binary_dir,
+                defs,
+            )
+        )
+        self.run(
+            '"%s" --build "%s" --config Release' % (self._cmake_program, binary_dir)
+        )
+        return binary_dir
+
+    def _pgo_flags(self, phase):
+        """Release compile and link flags for a PGO phase
+
+        Args:
+            phase (str): "generate" for the instrumented build, "use" for the
+                final build
+
+        Returns:
+            tuple(str, str): compile flags and link flags
+        """
+        profile_dir = os.path.join(self.build_folder, "pgo-profile")
+        profile_dir = profile_dir.replace("\\", "/")
+        release_flags = "-O3 -DNDEBUG"
+        if phase == "generate":
+            flags = "-fprofile-generate=%s" % profile_dir
+            if self.settings.compiler == "gcc":
+                # VTK's SMP backends update counters from several threads
+                flags += " -fprofile-update=atomic"
+            return "%s %s" % (release_flags, flags), flags
+        if self.settings.compiler == "gcc":
+            flags = "-fprofile-use=%s -fprofile-correction -Wno-missing-profile" % (
+                profile_dir
+            )
+        else:
+            flags = (
+                "-fprofile-use=%s/vtk.profdata -Wno-profile-instr-unprofiled"
+                " -Wno-profile-instr-out-of-date" % profile_dir
+            )
+        return "%s %s" % (release_flags, flags), flags
+
+    def _set_pgo_phase(self, phase):
+        compile_flags, link_flags = self._pgo_flags(phase)
+        self._cmake_reconfigure(
+            {
+                "CMAKE_C_FLAGS_RELEASE": compile_flags,
+                "CMAKE_CXX_FLAGS_RELEASE": compile_flags,
+                "CMAKE_EXE_LINKER_FLAGS_RELEASE": link_flags,
+                "CMAKE_SHARED_LINKER_FLAGS_RELEASE": link_flags,
+                "CMAKE_MODULE_LINKER_FLAGS_RELEASE": link_flags,
+            }
+        )
+
+    @timed_phase("pgo_train")
+    def _pgo_train(self, cmake):
+        """Build VTK instrumented, run the bundled training workload and
+        switch the build tree over to the collected profile.
+        """
+        self.output.info("PGO: building instrumented VTK")
+        self._set_pgo_phase("generate")
+        cmake.build(build_type="Release")
+
+        self.output.info("PGO: running training workload")
+        train_dir = self._build_helper_project("pgo")
+        work_dir = os.path.join(train_dir, "work")
+        tools.mkdir(work_dir)
+        lib_dir = os.path.join(self.build_folder, "lib", "Release")
+        args = []
+        if tools.get_env("DISPLAY") or self._headless or self.settings.os == "Macos":
+            args.append("--render")
+        with tools.environment_append(
+            {"LD_LIBRARY_PATH": lib_dir, "DYLD_LIBRARY_PATH": lib_dir}
+        ):
+            self.run(
+                '"%s" "%s" %s'
+                % (os.path.join(train_dir, "vtk_pgo_train"), work_dir, " ".join(args))
+            )
+
+        profile_dir = os.path.join(self.build_folder, "pgo-profile")
+        if self.settings.compiler in ("clang", "apple-clang"):
+            profdata = "llvm-profdata"
+            if self.settings.compiler == "apple-clang":
+                profdata = "xcrun llvm-profdata"
+            raw_profiles = [
+                os.path.join(profile_dir, name)
+                for name in os.listdir(profile_dir)
+                if name.endswith(".profraw")
+            ]
+            self.run(
+                '%s merge -output="%s" %s'
+                % (
+                    profdata,
+                    os.path.join(profile_dir, "vtk.profdata"),
+                    " ".join('"%s"' % raw for raw in raw_profiles),
+                )
+            )
+
+        self.output.info("PGO: rebuilding VTK with the collected profile")
+        self._set_pgo_phase("use")
+
+    def build(self):
+        env = self._compiler_cache_env()
+        env.update(self._compile_flags_env())
+        with tools.environment_append(env):
+            cache_stats = None
+            if self.options.compiler_cache:
+                cache_stats = self._compiler_cache_stats()
+            cmake = self._configure_cmake()
+            if self.options.optimization == "pgo":
+                self._pgo_train(cmake)
+            self._do_build(cmake)
+            if self.options.cpu_target != "baseline":
+                self._build_helper_project(
+                    "cpu_check", {"VTK_CPU_TARGET": self.options.cpu_target}
+                )
+            if self.options.compiler_cache:
+                self._report_compiler_cache(cache_stats)
+        self._report_pool_rss()
 
     # Package has no build type marking
     def package_id(self):
         del self.info.settings.build_type
+        # These only change how the binaries are compiled, not what they are
+        del self.info.options.compiler_cache
+        del self.info.options.unity_build
+        del self.info.options.unity_batch_size
+        del self.info.options.compile_jobs
+        del self.info.options.link_jobs
+        # The Qt module selection has no effect without Qt
+        if not self.options.qt:
+            del self.info.options.qt_modules
+        # Windows keeps the debug info in PDB files whatever debug_info is
+        if self.settings.os == "Windows":
+            del self.info.options.debug_info
         if self.settings.compiler == "Visual Studio":
-            del self.info.settings.compiler.runtime
+            # Both configurations are built against the runtime family of
+            # the profile, only the debug variant differs
+            runtime = str(self.settings.compiler.runtime)
+            self.info.settings.compiler.runtime = (
+                "MD" if runtime.startswith("MD") else "MT"
+            )
 
     def _pkg_bin(self, build_type):
-        src_dir = f"{self.build_folder}/lib/{build_type}"
+        src_dir = f"{self._vtk_build_folder}/lib/{build_type}"
         dst_lib = f"lib/{build_type}"
         dst_bin = f"bin/{build_type}"
+        # Runtime output of VTK goes to bin/<config>
+        src_bin = f"{self._vtk_build_folder}/bin/{build_type}"
         self.copy("*.lib", src=src_dir, dst=dst_lib, keep_path=False)
-        self.copy("*.dll", src=src_dir, dst=dst_bin, keep_path=False)
-        self.copy("*.so", src=src_dir, dst=dst_lib, keep_path=False)
-        self.copy("*.dylib", src=src_dir, dst=dst_lib, keep_path=False)
+        self.copy("*.dll", src=src_bin, dst=dst_bin, keep_path=False)
+        # Versioned shared objects and their symlinks
+        self.copy("*.so*", src=src_dir, dst=dst_lib, keep_path=False, symlinks=True)
+        self.copy("*.dylib", src=src_dir, dst=dst_lib, keep_path=False, symlinks=True)
         self.copy("*.a", src=src_dir, dst=dst_lib, keep_path=False)
         if ((build_type == "Debug") or (build_type == "RelWithDebInfo")) and (
             self.settings.compiler == "Visual Studio"
         ):
             self.copy("*.pdb", src=src_dir, dst=dst_lib, keep_path=False)
+            self.copy("*.pdb", src=src_bin, dst=dst_bin, keep_path=False)
+
+    def _relocate_cmake_files(self):
+        """Drop the macOS SDK include dirs from the exported CMake files of
+        the package.
+
+        Dependency package roots are kept: CMakeDeps, which consumers of
+        this package use, defines no variable that could replace them.
+        """
+        rules = relocation_rules(macos_sdk=tools.os_info.is_macos)
+        changed = relocate_cmake_files(
+            os.path.join(self.package_folder, "lib", "cmake"),
+            rules,
+            jobs=tools.cpu_count(),
+        )
+        self.output.info("Relocated paths in %d CMake files" % len(changed))
+
+    @timed_phase("package")
+    def _package_files(self):
+        self._relocate_cmake_files()
+        # Module metadata used by package_info() to declare components
+        modules_json = os.path.join(self._vtk_build_folder, "modules.json")
+        if os.path.isfile(modules_json):
+            dst = os.path.join(self.package_folder, self._modules_json)
+            tools.mkdir(os.path.dirname(dst))
+            shutil.copy2(modules_json, dst)
+        # Runtime check for the instruction set level
+        for program in ("vtk_cpu_check", "vtk_cpu_check.exe"):
+            self.copy(
+                program,
+                src=os.path.join(self.build_folder, "cpu_check_build"),
+                dst="bin",
+                keep_path=False,
+            )
+        for build_type in self._build_types:
+            self._pkg_bin(build_type)
+        if self._dev_build_root:
+            self._prune_stale_libraries()
+        if self.options.debug_info != "keep":
+            self._split_debug_info()
+
+    def _prune_stale_libraries(self):
+        """Remove the libraries of modules that are no longer selected, which
+        the persistent build tree of the developer mode still holds.
+        """
+        modules_json = os.path.join(self.package_folder, self._modules_json)
+        if not os.path.isfile(modules_json):
+            return
+        with open(modules_json) as file:
+            modules = json.load(file)["modules"]
+        current = set()
+        for module in modules.values():
+            library = self._vtk_lib_re.match(
+                "%s-%s" % (module.get("library_name", ""), self.short_version)
+            )
+            if library:
+                current.add(library.group(1))
+        for build_type in self._build_types:
+            for folder in ("lib", "bin"):
+                folder = os.path.join(self.package_folder, folder, build_type)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    library = self._vtk_lib_re.match(name)
+                    if library and library.group(1) not in current:
+                        self.output.info("Removing stale library %s" % name)
+                        os.remove(os.path.join(folder, name))
 
     def package(self):
-        for path, subdirs, names in os.walk(
-            os.path.join(self.package_folder, "lib", "cmake")
-        ):
+        self._package_files()
+        self._write_build_report()
+
+    def _record_phase(self, name, wall, cpu, peak_rss):
+        """Store the metrics of a recipe phase in METRICS_FILE. source() runs in
+        the source folder, which conan copies to the build folder.
+        """
+        folder = self.source_folder if name == "source" else self.build_folder
+        metrics_file = os.path.join(folder, METRICS_FILE)
+        phases = {}
+        if os.path.isfile(metrics_file):
+            with open(metrics_file) as file:
+                phases = json.load(file)
+        phases[name] = {
+            "wall_s": round(wall, 2),
+            "cpu_s": round(cpu, 2),
+            "peak_rss_mib": None if peak_rss is None else round(peak_rss, 1),
+        }
+        with open(metrics_file, "w") as file:
+            json.dump(phases, file, indent=2)
+        self.output.info(
+            "Phase %s: %.1f s wall, %.1f s CPU, peak RSS %s MiB"
+            % (name, wall, cpu, "n/a" if peak_rss is None else "%.0f" % peak_rss)
+        )
+
+    # VTK module libraries are named vtk<Module>-<major>.<minor>
+    _vtk_lib_re = re.compile(r"^(?:lib)?vtk(\w+?)-\d+\.\d+")
+
+    def _ninja_target_times(self):
+        """Per target compile and link durations from .ninja_log
+
+        Returns:
+            dict: target to compile seconds, object count and link seconds
+        """
+        ninja_log = os.path.join(self._vtk_build_folder, ".ninja_log")
+        if not os.path.isfile(ninja_log):
+            return {}
+        # Later entries for the same output replace earlier ones
+        entries = {}
+        with open(ninja_log) as log:
+            for line in log:
+                fields = line.rstrip("\n").split("\t")
+                if line.startswith("#") or len(fields) < 4:
+                    continue
+                entries[fields[3]] = (int(fields[1]) - int(fields[0])) / 1000.0
+
+        targets = {}
+        for output, seconds in entries.items():
+            object_dir = re.search(r"CMakeFiles/([^/]+)\.dir/", output)
+            if object_dir and output.endswith((".o", ".obj")):
+                target = targets.setdefault(
+                    object_dir.group(1), {"compile_s": 0.0, "objects": 0, "link_s": 0.0}
+                )
+                target["compile_s"] += seconds
+                target["objects"] += 1
+                continue
+            library = self._vtk_lib_re.match(os.path.basename(output))
+            if library:
+                target = targets.setdefault(
+                    library.group(1), {"compile_s": 0.0, "objects": 0, "link_s": 0.0}
+                )
+                target["link_s"] += seconds
+        for target in targets.values():
+            target["compile_s"] = round(target["compile_s"], 2)
+            target["link_s"] = round(target["link_s"], 2)
+        return dict(
+            sorted(
+                targets.items(),
+                key=lambda item: item[1]["compile_s"] + item[1]["link_s"],
+                reverse=True,
+            )
+        )
+
+    def _write_build_report(self):
+        """Write phase metrics, Ninja job pool memory use and per target
+        compile/link times to res/vtk_build_report.json in the package.
+        """
+        phases = {}
+        metrics_file = os.path.join(self.build_folder, METRICS_FILE)
+        if os.path.isfile(metrics_file):
+            with open(metrics_file) as file:
+                phases = json.load(file)
+        modules = {}
+        modules_report = os.path.join(self.build_folder, "modules_report.json")
+        if os.path.isfile(modules_report):
+            with open(modules_report) as file:
+                modules = json.load(file)
+        # The persistent tree of the developer mode logs the jobs of earlier
+        # runs as well, the times would not be those of this build
+        targets = {} if self._dev_build_root else self._ninja_target_times()
+        report = {
+            "options": {key: str(value) for key, value in self.options.items()},
+            "phases": phases,
+            "modules": modules,
+            "ninja_pools": self._pool_rss_summary(),
+            "targets": targets,
+        }
+        report_file = os.path.join(self.package_folder, "res", "vtk_build_report.json")
+        tools.mkdir(os.path.dirname(report_file))
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=2)
+        for target, times in list(targets.items())[:10]:
+            self.output.info(
+                "Slow target %s: compile %.0f s (%d objects), link %.1f s"
+                % (target, times["compile_s"], times["objects"], times["link_s"])
+            )
+
+    def _shared_libraries(self):
+        """Shared libraries in the package, skipping symlinks and debug files"""
+        patterns = ("*.dylib",) if self.settings.os == "Macos" else ("*.so", "*.so.*")
+        libraries = []
+        for path, subdirs, names in os.walk(os.path.join(self.package_folder, "lib")):
+            subdirs[:] = [
+                d for d in subdirs if d != ".debug" and not d.endswith(".dSYM")
+            ]
             for name in names:
-                if fnmatch(name, "*.cmake"):
-                    cmake_file = os.path.join(path, name)
+                file_path = os.path.join(path, name)
+                if os.path.islink(file_path):
+                    continue
+                if any(fnmatch(name, pattern) for pattern in patterns):
+                    libraries.append(file_path)
+        return libraries
 
-                    # if self.options.external_tiff:
-                    # self.cmake_fix_path(cmake_file, "libtiff")
-                    # if self.options.external_zlib:
-                    # self.cmake_fix_path(cmake_file, "zlib")
+    def _split_debug_info(self):
+        """Move the debug info of the shared libraries out of the binaries and
+        strip them.
 
-                    if tools.os_info.is_macos:
-                        self.cmake_fix_macos_sdk_path(cmake_file)
-        # Debug
-        # self._pkg_bin("Debug")
-        # Release
-        self._pkg_bin("Release")
+        debug_info=split keeps the debug files in the package: in a .debug
+        folder (Linux) or as a .dSYM bundle (macOS) next to each library,
+        where gdb and lldb find them. debug_info=strip moves them to
+        VTK_DEBUG_SYMBOLS_DIR if set, so they can be archived separately, and
+        drops them otherwise.
+        Windows already keeps debug info in PDB files.
+        """
+        if self.settings.os not in ("Linux", "Macos"):
+            return
+        symbols_dir = None
+        if self.options.debug_info == "strip":
+            symbols_dir = tools.get_env("VTK_DEBUG_SYMBOLS_DIR")
+            if symbols_dir:
+                # One folder per package id
+                package_id = os.path.basename(os.path.normpath(self.package_folder))
+                symbols_dir = os.path.join(symbols_dir, package_id)
 
-    def package_info(self):
-        self.cpp_info.libs = tools.collect_libs(self)
+        for library in self._shared_libraries():
+            relative = os.path.relpath(library, self.package_folder)
+            name = os.path.basename(library)
+            if self.options.debug_info == "split":
+                debug_dir = os.path.dirname(library)
+                if self.settings.os == "Linux":
+                    debug_dir = os.path.join(debug_dir, ".debug")
+            elif symbols_dir:
+                debug_dir = os.path.join(symbols_dir, os.path.dirname(relative))
+            else:
+                debug_dir = None
+
+            if self.settings.os == "Linux":
+                if debug_dir:
+                    tools.mkdir(debug_dir)
+                    debug_file = os.path.join(debug_dir, name + ".debug")
+                    self.run(
+                        'objcopy --only-keep-debug "%s" "%s"' % (library, debug_file)
+                    )
+                self.run('strip --strip-unneeded "%s"' % library)
+                if debug_dir:
+                    self.run(
+                        'objcopy --add-gnu-debuglink="%s" "%s"' % (debug_file, library)
+                    )
+            else:
+                if debug_dir:
+                    tools.mkdir(debug_dir)
+                    self.run(
+                        'dsymutil "%s" -o "%s"'
+                        % (library, os.path.join(debug_dir, name + ".dSYM"))
+                    )
+                self.run('strip -x "%s"' % library)
+
+    @property
+    def _modules_json(self):
+        return "lib/cmake/vtk-%s/modules.json" % self.short_version
+
+    @property
+    def _package_build_type(self):
+        """Configuration of the packaged libraries matching the consumer's
+        build_type, Release if the package has no Debug libraries.
+        """
+        if self.settings.build_type == "Debug" and self.options.build_debug:
+            return "Debug"
+        return "Release"
+
+    def _vtk_lib_name(self, library_name):
+        name = "%s-%s" % (library_name, self.short_version)
+        if (
+            self._package_build_type == "Debug"
+            and self.settings.compiler == "Visual Studio"
+        ):
+            name += "_d"
+        return name
+
+    # Requirements and the VTK modules that consume them
+    _external_requires = {
+        "qt": (
+            "GUISupportQt",
+            "GUISupportQtQuick",
+            "GUISupportQtSQL",
+            "RenderingQt",
+            "ViewsQt",
+        ),
+        "boost": ("xdmf3", "IOXdmf3", "InfovisBoost", "InfovisBoostGraphAlgorithms"),
+        "onetbb": ("CommonCore",),
+    }
+
+    def _declare_components(self, modules, includedirs, libdirs, bindirs):
+        """Create a cpp_info component per VTK module, using the module
+        dependency graph that VTK wrote to modules.json at configure time.
+
+        Args:
+            modules (dict): the "modules" section of modules.json
+            includedirs (list): include dirs shared by all modules
+            libdirs (list): lib dirs of the consumer's configuration
+            bindirs (list): bin dirs of the consumer's configuration
+        """
+        built_libs = set(tools.collect_libs(self, folder=libdirs[0]))
+
+        def component_name(module):
+            return module.split("::", 1)[-1]
+
+        enabled = {
+            name: info for name, info in modules.items() if info.get("enabled", True)
+        }
+        for name, info in enabled.items():
+            component = self.cpp_info.components[component_name(name)]
+            component.includedirs = includedirs
+            component.libdirs = libdirs
+            component.bindirs = bindirs
+            lib = self._vtk_lib_name(info.get("library_name", component_name(name)))
+            # Header only and interface modules have no library
+            component.libs = [lib] if lib in built_libs else []
+            depends = info.get("depends", []) + info.get("optional_depends", [])
+            if not self.options.shared:
+                # Static archives need their private dependencies at link time
+                depends += info.get("private_depends", [])
+            component.requires = sorted(
+                set(component_name(dep) for dep in depends if dep in enabled)
+            )
+
+        for requirement, users in self._external_requires.items():
+            if requirement not in self.deps_cpp_info.deps:
+                continue
+            targets = [user for user in users if user in self.cpp_info.components]
+            if not targets:
+                targets = ["CommonCore"]
+            for target in targets:
+                self.cpp_info.components[target].requires.append(
+                    "%s::%s" % (requirement, requirement)
+                )
+
+    def _system_libs(self):
+        """System libraries and frameworks of VTK modules, needed by
+        consumers of static libraries.
 
-        self.cpp_info.includedirs = [
+        Returns:
+            tuple(dict, dict): component name to system libs and to frameworks
+        """
+        system_libs, frameworks = {}, {}
+        if self.settings.os == "Linux":
+            system_libs = {
+                "CommonCore": ["pthread", "m"],
+                "vtksys": ["dl"],
+                "opengl": ["GL"],
+                "RenderingOpenGL2": ["X11", "Xext"],
+                "RenderingUI": ["X11"],
+            }
+            rendering_backend = self.options.get_safe("rendering_backend")
+            if rendering_backend == "osmesa":
+                system_libs["opengl"] = ["OSMesa"]
+                del system_libs["RenderingOpenGL2"], system_libs["RenderingUI"]
+            elif rendering_backend == "egl":
+                system_libs["opengl"] = ["EGL", "OpenGL"]
+                del system_libs["RenderingOpenGL2"], system_libs["RenderingUI"]
+        elif self.settings.os == "Windows":
+            system_libs = {
+                "vtksys": ["ws2_32", "psapi"],
+                "opengl": ["opengl32"],
+                "RenderingOpenGL2": ["opengl32"],
+            }
+        elif self.settings.os == "Macos":
+            frameworks = {
+                "opengl": ["OpenGL"],
+                "RenderingOpenGL2": ["Cocoa", "OpenGL", "IOKit"],
+                "RenderingUI": ["Cocoa"],
+            }
+        return system_libs, frameworks
+
+    def _static_link_info(self):
+        """System dependencies and linker flags for consumers of static
+        libraries. The link order of the VTK libraries follows from the
+        component requirements.
+        """
+        system_libs, frameworks = self._system_libs()
+        for name, libs in system_libs.items():
+            if name in self.cpp_info.components:
+                self.cpp_info.components[name].system_libs.extend(libs)
+        for name, names in frameworks.items():
+            if name in self.cpp_info.components:
+                self.cpp_info.components[name].frameworks.extend(names)
+
+        core = self.cpp_info.components["CommonCore"]
+        # Every module depends on CommonCore, so consumers get these once
+        if self.settings.os == "Linux":
+            core.exelinkflags.append("-Wl,--gc-sections")
+            core.sharedlinkflags.append("-Wl,--gc-sections")
+        elif self.settings.os == "Macos":
+            core.exelinkflags.append("-Wl,-dead_strip")
+            core.sharedlinkflags.append("-Wl,-dead_strip")
+        if self.options.optimization == "lto" and self.settings.compiler in (
+            "gcc",
+            "clang",
+        ):
+            # gcc archives only hold LTO bytecode, the consumer link does the
+            # code generation
+            core.exelinkflags.append("-flto")
+            core.sharedlinkflags.append("-flto")
+
+    def package_info(self):
+        includedirs = [
             "include/vtk-%s" % self.short_version,
             "include/vtk-%s/vtknetcdf/include" % self.short_version,
             "include/vtk-%s/vtknetcdfcpp" % self.short_version,
         ]
 
-        if self.settings.os == "Linux":
-            self.cpp_info.libs.append("pthread")
+        # Debug and Release libraries are packaged side by side
+        libdirs = ["lib/%s" % self._package_build_type]
+        bindirs = ["bin/%s" % self._package_build_type, "bin"]
+
+        modules_json = os.path.join(self.package_folder, self._modules_json)
+        if os.path.isfile(modules_json):
+            with open(modules_json, "r") as file:
+                self._declare_components(
+                    json.load(file)["modules"], includedirs, libdirs, bindirs
+                )
+            core = self.cpp_info.components["CommonCore"]
+            if not self.options.shared:
+                self._static_link_info()
+        else:
+            # Packages created before modules.json was shipped, the link order
+            # of static libraries is not known here
+            self.output.warn("No %s, linking all libraries" % self._modules_json)
+            self.cpp_info.libdirs = libdirs
+            self.cpp_info.bindirs = bindirs
+            self.cpp_info.libs = tools.collect_libs(self, folder=libdirs[0])
+            self.cpp_info.includedirs = includedirs
+            core = self.cpp_info
+
+        if self.settings.os == "Linux" and "pthread" not in core.system_libs:
+            core.system_libs.append("pthread")
+
+        # Consumers can run bin/vtk_cpu_check at startup to fail fast on CPUs
+        # that lack the instruction set extensions the package was built for
+        self.user_info.cpu_target = str(self.options.cpu_target)
+        if self.options.cpu_target != "baseline":
+            self.env_info.PATH.append(os.path.join(self.package_folder, "bin"))
+
+        # Let consumers find out which vtkSMPTools backend they got
+        self.user_info.smp_backend = str(self.options.smp_backend)
+        self.user_info.rendering_backend = str(
+            self.options.get_safe("rendering_backend", "native")
+        )
+        if (
+            not self.options.shared
+            and self.options.smp_backend == "OpenMP"
+            and self.settings.compiler in ("gcc", "clang")
+        ):
+            core.sharedlinkflags.append("-fopenmp")
+            core.exelinkflags.append("-fopenmp")
@@ -0,0 +1,152 @@
+/*
+ * Checks that the running CPU supports every instruction set extension the
+ * VTK package was compiled for. This file is compiled with the same flags as
+ * VTK, so the compiler's predefined macros (__AVX2__, ...) tell which
+ * extensions the binaries may use.
+ *
+ * Exits with 1 and lists the missing extensions when the CPU can't run the
+ * package, 0 otherwise.
+ */
+#include <stdio.h>
+#include <string.h>
+
+#if defined(_MSC_VER)
+#include <immintrin.h>
+#include <intrin.h>
+static void cpuid(unsigned leaf, unsigned subleaf, unsigned regs[4])
+{
+  int r[4];
+  __cpuidex(r, (int)leaf, (int)subleaf);
+  memcpy(regs, r, sizeof(r));
+}
+static unsigned long long xgetbv0(void)
+{
+  return _xgetbv(0);
+}
+#else
+#include <cpuid.h>
+static void cpuid(unsigned leaf, unsigned subleaf, unsigned regs[4])
+{
+  __cpuid_count(leaf, subleaf, regs[0], regs[1], regs[2], regs[3]);
+}
+static unsigned long long xgetbv0(void)
+{
+  unsigned eax, edx;
+  __asm__ volatile("xgetbv" : "=a"(eax), "=d"(edx) : "c"(0));
+  return ((unsigned long long)edx << 32) | eax;
+}
+#endif
+
+#define BIT(reg, n) (((reg) >> (n)) & 1u)
+
+struct feature
+{
+  const char* name;
+  int present;
+};
+
+int main(void)
+{
+  unsigned leaf1[4] = { 0 }, leaf7[4] = { 0 }, ext1[4] = { 0 }, regs[4];
+  unsigned long long xcr0 = 0;
+  int avx_os, avx512_os, i, missing = 0;
+
+  cpuid(0, 0, regs);
+  if (regs[0] >= 1)
+  {
+    cpuid(1, 0, leaf1);
+  }
+  if (regs[0] >= 7)
+  {
+    cpuid(7, 0, leaf7);
+  }
+  cpuid(0x80000000u, 0, regs);
+  if (regs[0] >= 0x80000001u)
+  {
+    cpuid(0x80000001u, 0, ext1);
+  }
+  if (BIT(leaf1[2], 27))
+  {
+    xcr0 = xgetbv0();
+  }
+  /* The OS has to save the AVX / AVX-512 register state too */
+  avx_os = (xcr0 & 0x6) == 0x6;
+  avx512_os = (xcr0 & 0xe6) == 0xe6;
+  (void)avx_os;
+  (void)avx512_os;
+
+  {
+    struct feature features[] = {
+#ifdef __SSE3__
+      { "sse3", BIT(leaf1[2], 0) },
+#endif
+#ifdef __SSSE3__
+      { "ssse3", BIT(leaf1[2], 9) },
+#endif
+#ifdef __SSE4_1__
+      { "sse4.1", BIT(leaf1[2], 19) },
+#endif
+#ifdef __SSE4_2__
+      { "sse4.2", BIT(leaf1[2], 20) },
+#endif
+#ifdef __POPCNT__
+      { "popcnt", BIT(leaf1[2], 23) },
+#endif
+#ifdef __GCC_HAVE_SYNC_COMPARE_AND_SWAP_16
+      { "cx16", BIT(leaf1[2], 13) },
+#endif
+#ifdef __MOVBE__
+      { "movbe", BIT(leaf1[2], 22) },
+#endif
+#ifdef __AVX__
+      { "avx", BIT(leaf1[2], 28) && avx_os },
+#endif
+#ifdef __F16C__
+      { "f16c", BIT(leaf1[2], 29) && avx_os },
+#endif
+#ifdef __FMA__
+      { "fma", BIT(leaf1[2], 12) && avx_os },
+#endif
+#ifdef __AVX2__
+      { "avx2", BIT(leaf7[1], 5) && avx_os },
+#endif
+#ifdef __BMI__
+      { "bmi", BIT(leaf7[1], 3) },
+#endif
+#ifdef __BMI2__
+      { "bmi2", BIT(leaf7[1], 8) },
+#endif
+#ifdef __LZCNT__
+      { "lzcnt", BIT(ext1[2], 5) },
+#endif
+#ifdef __AVX512F__
+      { "avx512f", BIT(leaf7[1], 16) && avx512_os },
+#endif
+      { "sse2", 1 },
+    };
+
+    for (i = 0; i < (int)(sizeof(features) / sizeof(features[0])); ++i)
+    {
+      if (!features[i].present)
+      {
+        if (!missing)
+        {
+          fprintf(stderr,
+            "This VTK package was built for cpu_target=%s, "
+            "but this CPU does not support:",
+            VTK_CPU_TARGET);
+        }
+        fprintf(stderr, " %s", features[i].name);
+        missing = 1;
+      }
+    }
+  }
+
+  if (missing)
+  {
+    fprintf(stderr, "\n");
+    return 1;
+  }
+  printf("This CPU can run VTK built for cpu_target=%s\n", VTK_CPU_TARGET);
+  return 0;
+}
@@ -0,0 +1,162 @@
+// Training workload for the profile-guided optimization build.
+//
+// Exercises the code paths our viewers spend most time in: contouring,
+// reslicing, decimation, XML I/O and (with --render) an offscreen render.
+// Usage: vtk_pgo_train <work dir> [--render]
+#include <vtkContourFilter.h>
+#include <vtkDecimatePro.h>
+#include <vtkFlyingEdges3D.h>
+#include <vtkImageData.h>
+#include <vtkImageReslice.h>
+#include <vtkNew.h>
+#include <vtkPolyData.h>
+#include <vtkQuadricDecimation.h>
+#include <vtkRTAnalyticSource.h>
+#include <vtkSmartPointer.h>
+#include <vtkTransform.h>
+
+#ifdef PGO_HAVE_IOXML
+#include <vtkXMLImageDataReader.h>
+#include <vtkXMLImageDataWriter.h>
+#include <vtkXMLPolyDataReader.h>
+#include <vtkXMLPolyDataWriter.h>
+#endif
+
+#ifdef PGO_HAVE_RENDERING
+#include <vtkActor.h>
+#include <vtkCamera.h>
+#include <vtkPolyDataMapper.h>
+#include <vtkRenderWindow.h>
+#include <vtkRenderer.h>
+#endif
+
+#include <cstring>
+#include <iostream>
+#include <string>
+
+namespace
+{
+vtkSmartPointer<vtkImageData> MakeVolume(int extent)
+{
+  vtkNew<vtkRTAnalyticSource> source;
+  source->SetWholeExtent(-extent, extent, -extent, extent, -extent, extent);
+  source->Update();
+  return source->GetOutput();
+}
+
+vtkSmartPointer<vtkPolyData> Contour(vtkImageData* volume)
+{
+  vtkNew<vtkFlyingEdges3D> flyingEdges;
+  flyingEdges->SetInputData(volume);
+  flyingEdges->GenerateValues(4, 100.0, 250.0);
+  flyingEdges->Update();
+
+  vtkNew<vtkContourFilter> contour;
+  contour->SetInputData(volume);
+  contour->GenerateValues(4, 100.0, 250.0);
+  contour->Update();
+  return contour->GetOutput();
+}
+
+void Reslice(vtkImageData* volume)
+{
+  vtkNew<vtkTransform> transform;
+  transform->RotateWXYZ(30.0, 1.0, 1.0, 0.0);
+  for (int interpolation : { VTK_RESLICE_NEAREST, VTK_RESLICE_LINEAR, VTK_RESLICE_CUBIC })
+  {
+    vtkNew<vtkImageReslice> reslice;
+    reslice->SetInputData(volume);
+    reslice->SetResliceTransform(transform);
+    reslice->SetInterpolationMode(interpolation);
+    reslice->Update();
+  }
+}
+
+void Decimate(vtkPolyData* surface)
+{
+  vtkNew<vtkQuadricDecimation> quadric;
+  quadric->SetInputData(surface);
+  quadric->SetTargetReduction(0.8);
+  quadric->Update();
+
+  vtkNew<vtkDecimatePro> pro;
+  pro->SetInputData(surface);
+  pro->SetTargetReduction(0.8);
+  pro->PreserveTopologyOn();
+  pro->Update();
+}
+
+#ifdef PGO_HAVE_IOXML
+void ReadWrite(vtkImageData* volume, vtkPolyData* surface, const std::string& dir)
+{
+  const std::string volumeFile = dir + "/pgo_volume.vti";
+  vtkNew<vtkXMLImageDataWriter> volumeWriter;
+  volumeWriter->SetInputData(volume);
+  volumeWriter->SetFileName(volumeFile.c_str());
+  volumeWriter->Write();
+  vtkNew<vtkXMLImageDataReader> volumeReader;
+  volumeReader->SetFileName(volumeFile.c_str());
+  volumeReader->Update();
+
+  const std::string surfaceFile = dir + "/pgo_surface.vtp";
+  vtkNew<vtkXMLPolyDataWriter> surfaceWriter;
+  surfaceWriter->SetInputData(surface);
+  surfaceWriter->SetFileName(surfaceFile.c_str());
+  surfaceWriter->Write();
+  vtkNew<vtkXMLPolyDataReader> surfaceReader;
+  surfaceReader->SetFileName(surfaceFile.c_str());
+  surfaceReader->Update();
+}
+#endif
+
+#ifdef PGO_HAVE_RENDERING
+void Render(vtkPolyData* surface)
+{
+  vtkNew<vtkPolyDataMapper> mapper;
+  mapper->SetInputData(surface);
+  vtkNew<vtkActor> actor;
+  actor->SetMapper(mapper);
+  vtkNew<vtkRenderer> renderer;
+  renderer->AddActor(actor);
+  vtkNew<vtkRenderWindow> window;
+  window->SetOffScreenRendering(1);
+  window->SetSize(512, 512);
+  window->AddRenderer(renderer);
+  for (int frame = 0; frame < 20; ++frame)
+  {
+    renderer->GetActiveCamera()->Azimuth(18.0);
+    window->Render();
+  }
+}
+#endif
+}
+
+int main(int argc, char* argv[])
+{
+  if (argc < 2)
+  {
+    std::cerr << "Usage: " << argv[0] << " <work dir> [--render]" << std::endl;
+    return 1;
+  }
+  const std::string workDir = argv[1];
+  const bool render = argc > 2 && std::strcmp(argv[2], "--render") == 0;
+
+  for (int extent : { 32, 64 })
+  {
+    vtkSmartPointer<vtkImageData> volume = MakeVolume(extent);
+    vtkSmartPointer<vtkPolyData> surface = Contour(volume);
+    Reslice(volume);
+    Decimate(surface);
+#ifdef PGO_HAVE_IOXML
+    ReadWrite(volume, surface, workDir);
+#endif
+#ifdef PGO_HAVE_RENDERING
+    if (render)
+    {
+      Render(surface);
+    }
+#endif
+  }
+  (void)render;
+  return 0;
+}
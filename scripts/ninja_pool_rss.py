@@ -0,0 +1,28 @@
+"""Compiler/linker launcher that records the peak RSS of each job.
+
+Used by the conan recipe as CMAKE_<LANG>_COMPILER_LAUNCHER and
+CMAKE_<LANG>_LINKER_LAUNCHER on the Ninja Multi-Config path, so the compile
+and link job pools can be sized from measured memory use.
+
+Usage: ninja_pool_rss.py <log file> <pool> <command> [args...]
+
+Appends "<pool>\t<peak rss in KiB>" to the log file and exits with the exit
+code of the command.
+"""
+import resource
+import subprocess
+import sys
+
+
+def main(argv):
+    log_file, pool, command = argv[1], argv[2], argv[3:]
+    returncode = subprocess.call(command)
+    # Largest RSS of any waited-for descendant (compiler, linker, ccache...)
+    peak_kib = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    with open(log_file, "a") as log:
+        log.write("%s\t%d\n" % (pool, peak_kib))
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
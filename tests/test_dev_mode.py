@@ -0,0 +1,113 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conanfile import VTKConan, changed_rule_commands, ninja_rule_commands
+
+RULES = """\
+#############################################
+# Rule for compiling CXX files.
+
+rule CXX_COMPILER__vtkCommonCore_unscanned_Release
+  depfile = $DEP_FILE
+  deps = gcc
+  command = {launcher} /usr/bin/c++ $DEFINES $INCLUDES $FLAGS -o $out -c $in
+  description = Building CXX object $out
+
+rule CXX_SHARED_LIBRARY_LINKER__vtkCommonCore_Release
+  command = {launcher} /usr/bin/c++ -fPIC $LINK_FLAGS -o $TARGET_FILE
+  restat = $RESTAT
+
+rule CUSTOM_COMMAND
+  command = $COMMAND
+"""
+
+
+def _write_rules(build_dir, launcher):
+    os.makedirs(os.path.join(build_dir, "CMakeFiles"), exist_ok=True)
+    with open(os.path.join(build_dir, "CMakeFiles", "rules.ninja"), "w") as file:
+        file.write(RULES.format(launcher=launcher))
+
+
+def test_rule_commands(tmp_path):
+    build_dir = str(tmp_path)
+    assert ninja_rule_commands(build_dir) == {}
+    _write_rules(build_dir, "python rss.py")
+    rules = ninja_rule_commands(build_dir)
+    assert sorted(rules) == [
+        "CXX_COMPILER__vtkCommonCore_unscanned_Release",
+        "CXX_SHARED_LIBRARY_LINKER__vtkCommonCore_Release",
+    ]
+    assert rules["CXX_COMPILER__vtkCommonCore_unscanned_Release"].startswith(
+        "python rss.py /usr/bin/c++"
+    )
+
+
+def test_changed_rule_commands(tmp_path):
+    before_dir, after_dir = str(tmp_path / "before"), str(tmp_path / "after")
+    _write_rules(before_dir, "python /dev/ninja_pool_rss.py")
+    _write_rules(after_dir, "python /dev/ninja_pool_rss.py")
+    before = ninja_rule_commands(before_dir)
+    after = dict(ninja_rule_commands(after_dir), CXX_COMPILER__vtkIOXML_Release="x")
+    assert changed_rule_commands(before, after) == []
+
+    _write_rules(after_dir, "python /build/0123/ninja_pool_rss.py")
+    assert changed_rule_commands(before, ninja_rule_commands(after_dir)) == [
+        "CXX_COMPILER__vtkCommonCore_unscanned_Release",
+        "CXX_SHARED_LIBRARY_LINKER__vtkCommonCore_Release",
+    ]
+
+
+class _Options(dict):
+    __getattr__ = dict.get
+
+    def get_safe(self, name, default=None):
+        return self.get(name, default)
+
+
+class _Compiler(str):
+    version = "11"
+
+
+class _Settings:
+    os = "Linux"
+    compiler = _Compiler("gcc")
+    arch = "x86_64"
+
+    def get_safe(self, name):
+        return "libstdc++11"
+
+
+def _recipe(build_folder, **options):
+    class Recipe(VTKConan):
+        pass
+
+    Recipe.build_folder = build_folder
+    Recipe.source_folder = build_folder
+    Recipe.settings = _Settings()
+    Recipe.options = _Options(
+        shared=True, cpu_target="baseline", optimization="none", **options
+    )
+    return Recipe.__new__(Recipe)
+
+
+def test_dev_paths_do_not_depend_on_the_package_id(tmp_path, monkeypatch):
+    monkeypatch.setenv("VTK_DEV_BUILD_DIR", str(tmp_path))
+    first = _recipe("/cache/build/1111", ioxml=False)
+    second = _recipe("/cache/build/2222", ioxml=True)
+    for attribute in (
+        "_dev_build_root",
+        "_vtk_build_folder",
+        "_pool_rss_script",
+        "_pool_rss_log",
+    ):
+        assert getattr(first, attribute) == getattr(second, attribute)
+        assert "/cache/build" not in getattr(first, attribute)
+
+
+def test_paths_without_dev_mode(monkeypatch):
+    monkeypatch.delenv("VTK_DEV_BUILD_DIR", raising=False)
+    recipe = _recipe("/cache/build/1111")
+    assert recipe._dev_build_root is None
+    assert recipe._pool_rss_log == "/cache/build/1111/ninja_pool_rss.log"
@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conanfile import relocate_cmake_files, relocate_text, relocation_rules
+
+SDK_INCLUDE = (
+    ";/Applications/Xcode.app/Contents/Developer/Platforms/MacOSX.platform"
+    "/Developer/SDKs/MacOSX11.3.sdk/usr/include"
+)
+CLT_SDK_INCLUDE = ";/Library/Developer/CommandLineTools/SDKs/MacOSX12.sdk/usr/include"
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(text)
+
+
+def _read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def test_rules_applied_in_one_pass():
+    # Earlier rules win where several match, and replacements are not
+    # matched again
+    rules = [("/deps/qt/plugins", "${QT_PLUGINS}"), ("/deps/qt", "/deps/qt/x")]
+    text = "/deps/qt/include;/deps/qt/plugins/platforms"
+    assert relocate_text(text, rules) == ("/deps/qt/x/include;${QT_PLUGINS}/platforms")
+
+
+def test_macos_sdk_include_dirs():
+    rules = relocation_rules(macos_sdk=True)
+    text = (
+        '"/usr/local/include%s"\n' % SDK_INCLUDE * 10 + '"/opt%s"\n' % CLT_SDK_INCLUDE
+    )
+    assert relocate_text(text, rules) == '"/usr/local/include"\n' * 10 + '"/opt"\n'
+    assert relocate_text(text, relocation_rules()) == text
+
+
+def test_only_changed_files_are_written(tmp_path):
+    changed = str(tmp_path / "lib" / "cmake" / "vtk-9.1" / "vtk-targets.cmake")
+    unchanged = str(tmp_path / "lib" / "cmake" / "vtk-9.1" / "vtk-config.cmake")
+    other = str(tmp_path / "lib" / "cmake" / "vtk-9.1" / "notes.txt")
+    _write(changed, 'INTERFACE_INCLUDE_DIRECTORIES "/usr/include%s"\n' % SDK_INCLUDE)
+    _write(unchanged, "include(vtk-targets.cmake)\n")
+    _write(other, SDK_INCLUDE)
+    os.utime(unchanged, (0, 0))
+
+    relocated = relocate_cmake_files(
+        str(tmp_path), relocation_rules(macos_sdk=True), jobs=2
+    )
+
+    assert relocated == [changed]
+    assert _read(changed) == 'INTERFACE_INCLUDE_DIRECTORIES "/usr/include"\n'
+    assert os.path.getmtime(unchanged) == 0
+    assert _read(other) == SDK_INCLUDE